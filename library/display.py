@@ -19,7 +19,7 @@ import sys
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from library import config
-from library.lcd.lcd_comm import Orientation
+from library.lcd.lcd_comm import AssetStore, Orientation
 from library.lcd.lcd_comm_rev_a import LcdCommRevA
 from library.lcd.lcd_comm_rev_b import LcdCommRevB
 from library.lcd.lcd_comm_rev_c import LcdCommRevC
@@ -52,6 +52,34 @@ def _get_theme_orientation() -> Orientation:
         return Orientation.PORTRAIT
 
 
+def _get_background_crop_box(widget, width: int, height: int):
+    # Region of the background image behind a transparent widget, computed like the LcdComm drawing primitives do
+    x = widget.get("X", 0)
+    y = widget.get("Y", 0)
+    if "RADIUS" in widget:
+        radius = widget["RADIUS"]
+        return x - radius, y - radius, x + radius, y + radius
+    elif widget.get("WIDTH", 0) and widget.get("HEIGHT", 0):
+        return max(x, 0), max(y, 0), min(x + widget["WIDTH"], width), min(y + widget["HEIGHT"], height)
+    else:
+        # Text without a fixed size: its region depends on the text
+        return None
+
+
+def _get_background_crops(theme_data, width: int, height: int, crops: dict):
+    # Walk the theme and collect { background image path: [boxes] } for all the displayed transparent widgets
+    for widget in theme_data.values():
+        if not isinstance(widget, dict):
+            continue
+        if "BACKGROUND_IMAGE" not in widget:
+            _get_background_crops(widget, width, height, crops)
+        elif widget["BACKGROUND_IMAGE"] and widget.get("SHOW", True):
+            box = _get_background_crop_box(widget, width, height)
+            if box:
+                crops.setdefault(_get_full_path(config.THEME_DATA['PATH'], widget["BACKGROUND_IMAGE"]), set()).add(box)
+    return crops
+
+
 class Display:
     def __init__(self):
         self.lcd = None
@@ -76,6 +104,10 @@ class Display:
         else:
             logger.error("Unknown display revision '", config.CONFIG_DATA["display"]["REVISION"], "'")
 
+        # Optionally, static images are sent from a cache of pre-encoded copies, compiled on first use
+        if self.lcd and config.CONFIG_DATA["display"].get("ASSET_CACHE", False):
+            self.lcd.asset_store = AssetStore(os.path.join(config.PATH, "asset_cache"))
+
     def initialize_display(self):
         # Reset screen in case it was in an unstable state (screen is also cleared)
         self.lcd.Reset()
@@ -106,6 +138,13 @@ class Display:
         # Turn off backplate RGB LED
         self.lcd.SetBackplateLedColor(led_color=(0, 0, 0))
 
+    def preload_background_crops(self):
+        # Decode the background regions of the theme transparent widgets once, now that the orientation is known
+        self.lcd.background_crops.clear()
+        crops = _get_background_crops(config.THEME_DATA, self.lcd.get_width(), self.lcd.get_height(), {})
+        for background_image, boxes in crops.items():
+            self.lcd.PreloadBackgroundCrops(background_image, sorted(boxes))
+
     def display_static_images(self):
         if config.THEME_DATA.get('static_images', False):
             for image in config.THEME_DATA['static_images']:
@@ -16,17 +16,21 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import copy
+import hashlib
 import math
+import mmap
 import os
 import queue
+import struct
 import sys
 import threading
 import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import IntEnum
 from typing import Tuple, List
 
+import numpy as np
 import serial
 from PIL import Image, ImageDraw, ImageFont
 
@@ -40,6 +44,181 @@ class Orientation(IntEnum):
     REVERSE_LANDSCAPE = 3
 
 
+# Characters that can be drawn from the glyph atlas: digits and the symbols found around numeric values
+GLYPH_ATLAS_CHARS = set("0123456789.,:/%-+ CFV")
+
+# Fonts directory, resolved from this file so that it does not depend on the current working directory
+FONTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "res", "fonts")
+
+# Fonts opened once per process and shared by every LcdComm instance and drawing primitive
+_font_registry = {}  # { key=(resolved path, size), value=PIL.ImageFont }
+_font_paths = {}  # { key=font as given by callers, value=resolved path }
+_font_registry_mutex = threading.Lock()
+
+
+def get_font(font: str, font_size: int) -> ImageFont.FreeTypeFont:
+    # Font path relative to res/fonts (or absolute), the TTF is only opened and parsed the first time it is requested
+    font_path = _font_paths.get(font)
+    if font_path is None:
+        font_path = _font_paths.setdefault(font, os.path.realpath(os.path.join(FONTS_DIR, font)))
+
+    font_key = (font_path, font_size)
+    font_object = _font_registry.get(font_key)
+    if font_object is None:
+        with _font_registry_mutex:
+            font_object = _font_registry.get(font_key)
+            if font_object is None:
+                font_object = ImageFont.truetype(font_path, font_size)
+                _font_registry[font_key] = font_object
+    return font_object
+
+
+class AssetStore:
+    # Static bitmaps pre-encoded in the wire format of a display revision, stored on disk and memory-mapped back, so
+    # that they can be sent with no decode nor pixel format conversion. Files are keyed by content hash, revision,
+    # orientation and placement: a modified image never matches a file compiled from its previous content, and the
+    # files compiled from that previous content are deleted. The oldest files are also deleted once the directory holds
+    # more than max_bytes.
+    # File layout: header, RGB pixels (for the shadow framebuffer), then the encoded data
+    MAGIC = b"LCDA"
+    HEADER = struct.Struct("<4sIII")  # magic, width, height, encoded data size
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Hash of image files, only computed again when their modification time or size changed
+        self.file_hashes = {}  # { key=path, value=((mtime, size), content hash) }
+
+    def content_hash(self, bitmap) -> str:
+        # Hash of an image file content, or of a PIL image pixels
+        if isinstance(bitmap, str):
+            stat = os.stat(bitmap)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            cached = self.file_hashes.get(bitmap)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            digest = hashlib.sha1()
+            with open(bitmap, "rb") as f:
+                digest.update(f.read())
+            content_hash = digest.hexdigest()
+            self.file_hashes[bitmap] = (signature, content_hash)
+            if cached is not None and cached[1] != content_hash and \
+                    all(known_hash != cached[1] for _, known_hash in self.file_hashes.values()):
+                # The file was modified (e.g. in the theme editor): its previous content will not be displayed again
+                self.remove(cached[1])
+            return content_hash
+
+        digest = hashlib.sha1()
+        digest.update(("%s%s" % (bitmap.mode, bitmap.size)).encode())
+        digest.update(bitmap.tobytes())
+        return digest.hexdigest()
+
+    def _asset_files(self) -> List[str]:
+        try:
+            return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".bin")]
+        except OSError:
+            return []
+
+    def remove(self, content_hash: str):
+        # Delete every asset compiled from this content
+        for path in self._asset_files():
+            if os.path.basename(path).startswith(content_hash + "-"):
+                self._delete(path)
+
+    def prune(self, keep: str = None):
+        # Delete the oldest assets (by compilation time) until the directory holds at most max_bytes
+        files = []
+        for path in self._asset_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._delete(path)
+                total -= size
+
+    @staticmethod
+    def _delete(path: str):
+        try:
+            os.remove(path)
+            logger.debug("Asset " + path + " deleted")
+        except OSError:
+            # Already deleted, or still mapped (Windows)
+            pass
+
+    def path(self, content_hash: str, revision: str, orientation: Orientation, placement: Tuple[int, ...]) -> str:
+        name = "%s-%s-%s-%s.bin" % (content_hash, revision, orientation.name, "-".join(str(p) for p in placement))
+        return os.path.join(self.directory, name)
+
+    def load(self, path: str):
+        # (RGB pixels, encoded data) memory-mapped from an asset file, None if it has not been compiled yet
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Not compiled yet, unreadable, or empty file (ValueError)
+            self.misses += 1
+            return None
+
+        magic, width, height, data_size = self.HEADER.unpack_from(mapped) if len(mapped) >= self.HEADER.size \
+            else (None, 0, 0, 0)
+        pixels_size = width * height * 3
+        if magic != self.MAGIC or len(mapped) != self.HEADER.size + pixels_size + data_size:
+            logger.warning("Asset " + path + " is invalid, it will be compiled again")
+            mapped.close()
+            self.misses += 1
+            return None
+
+        pixels = np.frombuffer(mapped, dtype=np.uint8, count=pixels_size, offset=self.HEADER.size)
+        data = memoryview(mapped)[self.HEADER.size + pixels_size:]
+        self.hits += 1
+        return pixels.reshape((height, width, 3)), data
+
+    def save(self, path: str, pixels: np.ndarray, data: bytes) -> bool:
+        # Write to a temporary file first, so that a reader never maps a partially written asset.
+        # Returns False if the asset could not be stored (e.g. read-only directory)
+        height, width = pixels.shape[:2]
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, width, height, len(data)))
+                f.write(np.ascontiguousarray(pixels, dtype=np.uint8).tobytes())
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("Cannot store asset " + path + " (" + str(e) + "), the image is sent without the store")
+            self._delete(temp_path)
+            return False
+        logger.debug("Asset " + path + " compiled")
+        self.prune(keep=path)
+        return True
+
+
+class EncodedBitmapTransfer(ABC):
+    # Optional interface of the LcdComm revisions that have a wire format independent of the display state, so that
+    # static bitmaps can be encoded once, stored by AssetStore and sent again as-is (see DisplayStaticBitmap)
+
+    @abstractmethod
+    def EncodeBitmap(self, image: Image, x: int, y: int):
+        # Image (fitting the display at x, y) encoded in the wire format of this revision, as sent by
+        # SendEncodedBitmap(). None if the revision has no such format for this placement
+        pass
+
+    @abstractmethod
+    def SendEncodedBitmap(self, data: bytes, x: int, y: int, image_width: int, image_height: int):
+        # Send data produced by EncodeBitmap()
+        pass
+
+
 class LcdComm(ABC):
     def __init__(self, com_port: str = "AUTO", display_width: int = 320, display_height: int = 480,
                  update_queue: queue.Queue = None):
@@ -63,11 +242,55 @@ class LcdComm(ABC):
         # mixed with other requests in-between
         self.update_queue_mutex = threading.Lock()
 
-        # Create a cache to store opened images, to avoid opening and loading from the filesystem every time
-        self.image_cache = {}  # { key=path, value=PIL.Image }
-
-        # Create a cache to store opened fonts, to avoid opening and loading from the filesystem every time
-        self.font_cache = {}  # { key=(font, size), value=PIL.ImageFont }
+        # Create a bounded LRU cache of decoded images, to avoid opening and decoding files from the filesystem every
+        # time. Pixels are stored as read-only arrays (whole images and cropped regions), evicted once their total size
+        # exceeds image_cache_budget bytes. Hits/misses/evictions are counted to check its efficiency
+        self.image_cache = OrderedDict()  # { key=(path, box), value=np.ndarray }
+        self.image_cache_budget = 16 * 1024 * 1024
+        self.image_cache_bytes = 0
+        self.image_cache_hits = 0
+        self.image_cache_misses = 0
+        self.image_cache_evictions = 0
+        self.image_cache_mutex = threading.Lock()
+
+        # Regions of background images behind transparent widgets, decoded when the theme loads and never evicted
+        # (see PreloadBackgroundCrops)
+        self.background_crops = {}  # { key=(path, box), value=np.ndarray }
+
+        # Create a bounded LRU cache of rendered text bitmaps, to skip PIL rasterization when the same text is drawn
+        # again with the same parameters. Hits/misses are counted to check its efficiency
+        self.text_cache = OrderedDict()  # { key=(text + all render parameters), value=(PIL.Image, left, top) }
+        self.text_cache_size = 256
+        self.text_cache_hits = 0
+        self.text_cache_misses = 0
+        # Stats threads may draw text concurrently
+        self.text_cache_mutex = threading.Lock()
+
+        # Shadow framebuffer: RGB copy of the panel content in the current orientation, updated by every draw, with a
+        # mask of where that content is known (nothing is known before the first draws, after an orientation change, or
+        # after a reset/clear: see ForgetFramebuffer). Between BeginFrame() and EndFrame(), draws only update the shadow
+        # framebuffer: the areas they changed are sent by EndFrame() as a minimal set of rectangles.
+        # Transfers are done while holding framebuffer_mutex, so they reach the panel in the order of the updates
+        self.framebuffer_enabled = True
+        self.framebuffer = None  # numpy array (height, width, 3)
+        self.framebuffer_known = None  # numpy bool array (height, width)
+        self.framebuffer_orientation = None
+        self.framebuffer_mutex = threading.Lock()
+        self.frame_dirty_rects = None  # [(left, top, right, bottom)] while a frame is open
+        # Cost of one more transfer (command + round trip), expressed in pixels: rectangles are merged while sending the
+        # union is cheaper than sending them separately
+        self.transfer_overhead_pixels = 1024
+        # Only send the tight bounding box of the pixels that differ from the known panel content (nothing if none)
+        self.framebuffer_diff = True
+
+        # Store of static bitmaps pre-encoded for this revision (see AssetStore and DisplayStaticBitmap), None to disable
+        self.asset_store = None
+
+        # Glyph atlas mode: text in a fixed box (width/height given) on a solid background, made only of
+        # GLYPH_ATLAS_CHARS, is composed from glyphs rasterized once instead of being rendered by PIL on every call
+        self.glyph_atlas_enabled = False
+        # { key=(font, size, font color, background color), value={ key=char, value=(RGB array, ink above/below baseline) } }
+        self.glyph_atlas = {}
 
     def get_width(self) -> int:
         if self.orientation == Orientation.PORTRAIT or self.orientation == Orientation.REVERSE_PORTRAIT:
@@ -191,18 +414,171 @@ class LcdComm(ABC):
         pass
 
     @abstractmethod
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
             image_width: int = 0,
             image_height: int = 0
     ):
+        # Transfer the image to the display as-is: drawing goes through DisplayPILImage
         pass
 
+    def ForgetFramebuffer(self):
+        # To be called when the panel content changed without a DisplayPILImage call (e.g. reset or clear command)
+        with self.framebuffer_mutex:
+            if self.framebuffer_known is not None:
+                self.framebuffer_known[:] = False
+
+    def _UpdateFramebuffer(self, image, x: int, y: int, image_width: int, image_height: int):
+        # Copy the visible part of `image` (PIL image or RGB array) into the shadow framebuffer, and return the area to
+        # send: the whole visible part, or with framebuffer_diff only the bounding box of the pixels that changed (None
+        # if nothing to send)
+        width, height = self.get_width(), self.get_height()
+        if self.framebuffer is None or self.framebuffer_orientation != self.orientation or \
+                self.framebuffer.shape[:2] != (height, width):
+            # First draw, or orientation changed: nothing is known about the panel content yet
+            self.framebuffer = np.zeros((height, width, 3), dtype=np.uint8)
+            self.framebuffer_known = np.zeros((height, width), dtype=bool)
+            self.framebuffer_orientation = self.orientation
+
+        if not isinstance(image, np.ndarray):
+            image = np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+        right = min(x + (image_width or image.shape[1]), width)
+        bottom = min(y + (image_height or image.shape[0]), height)
+        if right <= x or bottom <= y:
+            return None
+        pixels = image[:bottom - y, :right - x]
+        if self.framebuffer_diff:
+            changed = (pixels != self.framebuffer[y:bottom, x:right]).any(axis=2)
+            changed |= ~self.framebuffer_known[y:bottom, x:right]
+            rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+            if rows.size == 0:
+                return None
+            x, y, right, bottom = x + columns[0], y + rows[0], x + columns[-1] + 1, y + rows[-1] + 1
+            pixels = pixels[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+        self.framebuffer[y:bottom, x:right] = pixels
+        self.framebuffer_known[y:bottom, x:right] = True
+        return int(x), int(y), int(right), int(bottom)
+
+    def DisplayPILImage(
+            self,
+            image: Image,
+            x: int = 0, y: int = 0,
+            image_width: int = 0,
+            image_height: int = 0
+    ):
+        # Draw through the shadow framebuffer: only the area that changed is sent (or nothing, inside a frame)
+        if not self.framebuffer_enabled:
+            self.SendPILImage(image, x, y, image_width, image_height)
+            return
+
+        with self.framebuffer_mutex:
+            rect = self._UpdateFramebuffer(image, x, y, image_width, image_height)
+            if rect is None:
+                # Nothing visible, or nothing changed
+                return
+            if self.frame_dirty_rects is not None:
+                # Sent by EndFrame()
+                self.frame_dirty_rects.append(rect)
+                return
+            left, top, right, bottom = rect
+            if (left, top, right - left, bottom - top) != (x, y, image.size[0], image.size[1]):
+                image = image.crop((left - x, top - y, right - x, bottom - y))
+            self.SendPILImage(image, left, top)
+
+    def BeginFrame(self):
+        # Start accumulating draws: they are sent together by EndFrame()
+        with self.framebuffer_mutex:
+            if self.frame_dirty_rects is None:
+                self.frame_dirty_rects = []
+
+    def EndFrame(self) -> List[Tuple[int, int, int, int]]:
+        # Send the areas changed since BeginFrame(), merged into as few transfers as the cost model allows.
+        # Returns the rectangles sent
+        with self.framebuffer_mutex:
+            rects = self.CoalesceRects(self.frame_dirty_rects or [])
+            self.frame_dirty_rects = None
+            for left, top, right, bottom in rects:
+                self.SendPILImage(Image.fromarray(self.framebuffer[top:bottom, left:right]), left, top)
+        return rects
+
+    def CoalesceRects(self, rects: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        # Greedily merge pairs of rectangles while sending their bounding box costs no more than sending both
+        # (each transfer costs its pixels + transfer_overhead_pixels). A bounding box is only used if every pixel in
+        # it is known, so that merging never sends stale content
+        def cost(rect):
+            left, top, right, bottom = rect
+            return (right - left) * (bottom - top) + self.transfer_overhead_pixels
+
+        rects = list(dict.fromkeys(rects))
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    a, b = rects[i], rects[j]
+                    union = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    if cost(union) <= cost(a) + cost(b) and \
+                            self.framebuffer_known[union[1]:union[3], union[0]:union[2]].all():
+                        rects[i] = union
+                        del rects[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return rects
+
     def DisplayBitmap(self, bitmap_path: str, x: int = 0, y: int = 0, width: int = 0, height: int = 0):
-        image = self.open_image(bitmap_path)
-        self.DisplayPILImage(image, x, y, width, height)
+        self.DisplayStaticBitmap(bitmap_path, x, y, width, height)
+
+    def CompileStaticBitmap(self, bitmap, x: int = 0, y: int = 0, width: int = 0, height: int = 0):
+        # Pre-encoded asset of a static image (file path or PIL image) for this revision and orientation, as
+        # (RGB pixels, encoded data) memory-mapped from asset_store, compiled the first time.
+        # None if this revision has no wire format for it
+        revision = "%s-%dx%d" % (type(self).__name__, self.display_width, self.display_height)
+        path = self.asset_store.path(self.asset_store.content_hash(bitmap), revision, self.orientation,
+                                     (x, y, width, height))
+        asset = self.asset_store.load(path)
+        if asset is None:
+            image = self.open_image(bitmap) if isinstance(bitmap, str) else bitmap
+
+            # Same clipping as DisplayPILImage
+            image_width = min(width or image.size[0], self.get_width() - x)
+            image_height = min(height or image.size[1], self.get_height() - y)
+            if image_width <= 0 or image_height <= 0:
+                return None
+            if image.size != (image_width, image_height):
+                image = image.crop((0, 0, image_width, image_height))
+
+            data = self.EncodeBitmap(image, x, y)
+            if data is None:
+                return None
+            if not self.asset_store.save(path, np.asarray(image.convert('RGB')), data):
+                return None
+            asset = self.asset_store.load(path)
+        return asset
+
+    def DisplayStaticBitmap(self, bitmap, x: int = 0, y: int = 0, width: int = 0, height: int = 0):
+        # Display a static image (file path or PIL image). With an asset_store, its pre-encoded copy is streamed to the
+        # display with no decode nor conversion (it is compiled on first use)
+        asset = None
+        if self.asset_store is not None and isinstance(self, EncodedBitmapTransfer):
+            asset = self.CompileStaticBitmap(bitmap, x, y, width, height)
+        if asset is None:
+            image = self.open_image(bitmap) if isinstance(bitmap, str) else bitmap
+            self.DisplayPILImage(image, x, y, width, height)
+            return
+
+        pixels, data = asset
+        if not self.framebuffer_enabled:
+            self.SendEncodedBitmap(data, x, y, pixels.shape[1], pixels.shape[0])
+            return
+        with self.framebuffer_mutex:
+            if self._UpdateFramebuffer(pixels, x, y, 0, 0) is None:
+                # Already on the panel
+                return
+            self.SendEncodedBitmap(data, x, y, pixels.shape[1], pixels.shape[0])
 
     def DisplayText(
             self,
@@ -235,25 +611,28 @@ class LcdComm(ABC):
         assert len(text) > 0, 'Text must not be empty'
         assert font_size > 0, "Font size must be > 0"
 
-        if background_image is None:
-            # A text bitmap is created with max width/height by default : text with solid background
-            text_image = Image.new(
-                'RGB',
-                (self.get_width(), self.get_height()),
-                background_color
-            )
-        else:
-            # The text bitmap is created from provided background image : text with transparent background
-            text_image = self.open_image(background_image)
+        # Same text with the same parameters as a recent call: display the cached bitmap
+        cache_key = (text, x, y, width, height, font, font_size, font_color, background_color, background_image, align,
+                     anchor, self.get_width(), self.get_height())
+        with self.text_cache_mutex:
+            cached = self.text_cache.get(cache_key)
+            if cached is not None:
+                self.text_cache.move_to_end(cache_key)
+                self.text_cache_hits += 1
+            else:
+                self.text_cache_misses += 1
+        if cached is not None:
+            text_image, left, top = cached
+            self.DisplayPILImage(text_image, left, top)
+            return
 
         # Get text bounding box
-        if (font, font_size) not in self.font_cache:
-            font_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "res", "fonts", font)
-            self.font_cache[(font, font_size)] = ImageFont.truetype(font_path, font_size)
-        font = self.font_cache[(font, font_size)]
-        d = ImageDraw.Draw(text_image)
+        font_key = (font, font_size)
+        font = get_font(font, font_size)
 
         if width == 0 or height == 0:
+            # Measure the text before creating its bitmap, so that only the bounding box has to be allocated
+            d = ImageDraw.Draw(Image.new('RGB', (1, 1)))
             left, top, right, bottom = d.textbbox((x, y), text, font=font, align=align, anchor=anchor)
 
             # textbbox may return float values, which is not good for the bitmap operations below.
@@ -277,20 +656,87 @@ class LcdComm(ABC):
             else:
                 y = top
 
-        # Draw text onto the background image with specified color & font
-        d.text((x, y), text, font=font, fill=font_color, align=align, anchor=anchor)
-
         # Restrict the dimensions if they overflow the display size
         left = max(left, 0)
         top = max(top, 0)
         right = min(right, self.get_width())
         bottom = min(bottom, self.get_height())
 
-        # Crop text bitmap to keep only the text
-        text_image = text_image.crop(box=(left, top, right, bottom))
+        if (self.glyph_atlas_enabled and background_image is None and width and height and "\n" not in text
+                and GLYPH_ATLAS_CHARS.issuperset(text)):
+            # Numeric text in a fixed box: composed from pre-rasterized glyphs, no FreeType call
+            text_image = self.ComposeGlyphs(text, font_key, font_color, background_color, x - left, y - top, anchor,
+                                            right - left, bottom - top)
+        elif background_image is None:
+            # Text with solid background: the bitmap only covers the text bounding box, text coordinates are
+            # translated accordingly
+            text_image = Image.new('RGB', (right - left, bottom - top), background_color)
+            d = ImageDraw.Draw(text_image)
+            d.text((x - left, y - top), text, font=font, fill=font_color, align=align, anchor=anchor)
+        else:
+            # The text bitmap is created from the region of provided background image behind the text : text with
+            # transparent background
+            text_image = self.open_image(background_image, (left, top, right, bottom))
+            d = ImageDraw.Draw(text_image)
+            d.text((x - left, y - top), text, font=font, fill=font_color, align=align, anchor=anchor)
+
+        if self.text_cache_size > 0:
+            with self.text_cache_mutex:
+                self.text_cache[cache_key] = (text_image, left, top)
+                if len(self.text_cache) > self.text_cache_size:
+                    self.text_cache.popitem(last=False)
 
         self.DisplayPILImage(text_image, left, top)
 
+    def _get_glyphs(self, font_key: Tuple[str, int], font_color: Tuple[int, int, int],
+                    background_color: Tuple[int, int, int], text: str) -> dict:
+        # Glyphs of the atlas for these font/colors, rasterizing the missing characters of `text` (once)
+        glyphs = self.glyph_atlas.setdefault((font_key, font_color, background_color), {})
+        missing = set(text).difference(glyphs)
+        if missing:
+            font = get_font(*font_key)
+            ascent, descent = font.getmetrics()
+            for char in missing:
+                # Each glyph fills its advance width over the whole line height, with its baseline at `ascent`
+                left, top, right, bottom = font.getbbox(char, anchor="ls")
+                cell = Image.new('RGB', (int(font.getlength(char)), ascent + descent), background_color)
+                ImageDraw.Draw(cell).text((0, ascent), char, font=font, fill=font_color, anchor="ls")
+                glyphs[char] = (np.asarray(cell), max(-top, 0), max(bottom, 0))
+        return glyphs
+
+    def ComposeGlyphs(self, text: str, font_key: Tuple[str, int], font_color: Tuple[int, int, int],
+                      background_color: Tuple[int, int, int], x: float, y: float, anchor: str, width: int,
+                      height: int) -> Image:
+        # Draw `text` anchored at (x, y) in a width x height bitmap, by concatenating atlas glyphs (numpy slicing)
+        glyphs = self._get_glyphs(font_key, font_color, background_color, text)
+        ascent, descent = get_font(*font_key).getmetrics()
+        strip = np.concatenate([glyphs[char][0] for char in text], axis=1)
+
+        # Same anchors as PIL: horizontal l/m/r, vertical a/t/m/s/b/d ("t"/"b" are the ink top/bottom of the text)
+        anchor = anchor or "la"
+        text_width = strip.shape[1]
+        text_x = {"m": x - text_width / 2, "r": x - text_width}.get(anchor[0], x)
+        baseline = {
+            "t": y + max(glyphs[char][1] for char in text),
+            "m": y + (ascent - descent) / 2,
+            "s": y,
+            "b": y - max(glyphs[char][2] for char in text),
+            "d": y - descent,
+        }.get(anchor[1:2], y + ascent)
+        left, top = math.floor(text_x + 0.5), math.floor(baseline - ascent + 0.5)
+
+        # Copy the visible part of the strip onto the background
+        bitmap = np.empty((height, width, 3), dtype=np.uint8)
+        bitmap[:] = background_color
+        src_left, src_top = max(-left, 0), max(-top, 0)
+        dst_left, dst_top = max(left, 0), max(top, 0)
+        copy_width = min(strip.shape[1] - src_left, width - dst_left)
+        copy_height = min(strip.shape[0] - src_top, height - dst_top)
+        if copy_width > 0 and copy_height > 0:
+            bitmap[dst_top:dst_top + copy_height, dst_left:dst_left + copy_width] = \
+                strip[src_top:src_top + copy_height, src_left:src_left + copy_width]
+        return Image.fromarray(bitmap)
+
     def DisplayProgressBar(self, x: int, y: int, width: int, height: int, min_value: int = 0, max_value: int = 100,
                            value: int = 50,
                            bar_color: Tuple[int, int, int] = (0, 0, 0),
@@ -323,11 +769,8 @@ class LcdComm(ABC):
             # A bitmap is created with solid background
             bar_image = Image.new('RGB', (width, height), background_color)
         else:
-            # A bitmap is created from provided background image
-            bar_image = self.open_image(background_image)
-
-            # Crop bitmap to keep only the progress bar background
-            bar_image = bar_image.crop(box=(x, y, x + width, y + height))
+            # A bitmap is created from the progress bar background region of provided background image
+            bar_image = self.open_image(background_image, (x, y, x + width, y + height))
 
         # Draw progress bar
         bar_filled_width = (value / (max_value - min_value) * width) - 1
@@ -374,11 +817,8 @@ class LcdComm(ABC):
             # A bitmap is created with solid background
             graph_image = Image.new('RGB', (width, height), background_color)
         else:
-            # A bitmap is created from provided background image
-            graph_image = self.open_image(background_image)
-
-            # Crop bitmap to keep only the plot graph background
-            graph_image = graph_image.crop(box=(x, y, x + width, y + height))
+            # A bitmap is created from the plot graph background region of provided background image
+            graph_image = self.open_image(background_image, (x, y, x + width, y + height))
 
         # if autoscale is enabled, define new min/max value to "zoom" the graph
         if autoscale:
@@ -429,13 +869,13 @@ class LcdComm(ABC):
             # Draw Legend
             draw.line([0, 0, 1, 0], fill=axis_color)
             text = f"{int(max_value)}"
-            font = ImageFont.truetype("./res/fonts/" + "roboto/Roboto-Black.ttf", 10)
+            font = get_font("roboto/Roboto-Black.ttf", 10)
             left, top, right, bottom = font.getbbox(text)
             draw.text((2, 0 - top), text,
                       font=font, fill=axis_color)
 
             text = f"{int(min_value)}"
-            font = ImageFont.truetype("./res/fonts/" + "roboto/Roboto-Black.ttf", 10)
+            font = get_font("roboto/Roboto-Black.ttf", 10)
             left, top, right, bottom = font.getbbox(text)
             draw.text((width - 1 - right, height - 2 - bottom), text,
                       font=font, fill=axis_color)
@@ -501,11 +941,8 @@ class LcdComm(ABC):
             # A bitmap is created with solid background
             bar_image = Image.new('RGB', (diameter, diameter), background_color)
         else:
-            # A bitmap is created from provided background image
-            bar_image = self.open_image(background_image)
-
-            # Crop bitmap to keep only the progress bar background
-            bar_image = bar_image.crop(box=bbox)
+            # A bitmap is created from the progress bar background region of provided background image
+            bar_image = self.open_image(background_image, bbox)
 
         # Draw progress bar
         pct = (value - min_value) / (max_value - min_value)
@@ -587,7 +1024,7 @@ class LcdComm(ABC):
         if with_text:
             if text is None:
                 text = f"{int(pct * 100 + .5)}%"
-            font = ImageFont.truetype("./res/fonts/" + font, font_size)
+            font = get_font(font, font_size)
             left, top, right, bottom = font.getbbox(text)
             w, h = right - left, bottom - top
             draw.text((radius - w / 2, radius - top - h / 2), text,
@@ -595,9 +1032,65 @@ class LcdComm(ABC):
 
         self.DisplayPILImage(bar_image, xc - radius, yc - radius)
 
-    # Load image from the filesystem, or get from the cache if it has already been loaded previously
-    def open_image(self, bitmap_path: str) -> Image:
-        if bitmap_path not in self.image_cache:
+    # Load image pixels from the filesystem, or get them from the cache if they have already been loaded previously.
+    # The returned array is read-only, optionally restricted to box=(left, top, right, bottom)
+    def open_image_array(self, bitmap_path: str, box: Tuple[int, int, int, int] = None) -> np.ndarray:
+        cache_key = (bitmap_path, box)
+        pixels = self.background_crops.get(cache_key)
+        if pixels is not None:
+            self.image_cache_hits += 1
+            return pixels
+
+        with self.image_cache_mutex:
+            pixels = self.image_cache.get(cache_key)
+            if pixels is not None:
+                self.image_cache.move_to_end(cache_key)
+                self.image_cache_hits += 1
+                return pixels
+            self.image_cache_misses += 1
+
+        if box is None:
+            with Image.open(bitmap_path) as image:
+                # Decode once, keeping an alpha channel only if the image has transparency
+                if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+                    image = image.convert("RGBA")
+                elif image.mode != "RGB":
+                    image = image.convert("RGB")
+                else:
+                    image.load()
+                pixels = np.asarray(image)
             logger.debug("Bitmap " + bitmap_path + " is now loaded in the cache")
-            self.image_cache[bitmap_path] = Image.open(bitmap_path)
-        return copy.copy(self.image_cache[bitmap_path])
+        else:
+            # Copy the region, so that it stays cached even if the whole image is evicted. As with Image.crop(), the
+            # parts of the box outside the image are filled with zeros (black, transparent)
+            image = self.open_image_array(bitmap_path)
+            left, top, right, bottom = box
+            pixels = np.zeros((max(bottom - top, 0), max(right - left, 0)) + image.shape[2:], dtype=image.dtype)
+            src_left, src_top = max(left, 0), max(top, 0)
+            src_right, src_bottom = min(right, image.shape[1]), min(bottom, image.shape[0])
+            if src_right > src_left and src_bottom > src_top:
+                pixels[src_top - top:src_bottom - top, src_left - left:src_right - left] = \
+                    image[src_top:src_bottom, src_left:src_right]
+        pixels.flags.writeable = False
+
+        with self.image_cache_mutex:
+            if pixels.nbytes <= self.image_cache_budget and cache_key not in self.image_cache:
+                self.image_cache[cache_key] = pixels
+                self.image_cache_bytes += pixels.nbytes
+                while self.image_cache_bytes > self.image_cache_budget:
+                    _, evicted = self.image_cache.popitem(last=False)
+                    self.image_cache_bytes -= evicted.nbytes
+                    self.image_cache_evictions += 1
+        return pixels
+
+    # Decode the regions of a background image behind transparent widgets once, so that each widget refresh starts
+    # from a ready-made tile. Boxes are (left, top, right, bottom) as used by the widgets
+    def PreloadBackgroundCrops(self, background_image: str, boxes: List[Tuple[int, int, int, int]]):
+        for box in boxes:
+            self.background_crops[(background_image, box)] = self.open_image_array(background_image, box)
+        logger.debug("%d background regions of %s preloaded" % (len(boxes), background_image))
+
+    # Get an image (or a region of it) from the cache. It shares the cached pixels when its mode allows it, drawing on
+    # it makes a private copy first
+    def open_image(self, bitmap_path: str, box: Tuple[int, int, int, int] = None) -> Image:
+        return Image.fromarray(self.open_image_array(bitmap_path, box))
@@ -51,7 +51,7 @@ class SubRevision(Enum):
     USBMONITOR_7 = bytearray([0x03, 0x03, 0x03, 0x03, 0x03, 0x03])
 
 # This class is for Turing Smart Screen (rev. A) 3.5" and UsbMonitor screens (all sizes)
-class LcdCommRevA(LcdComm):
+class LcdCommRevA(LcdComm, EncodedBitmapTransfer):
     def __init__(self, com_port: str = "AUTO", display_width: int = 320, display_height: int = 480,
                  update_queue: queue.Queue = None):
         logger.debug("HW revision: A")
@@ -128,11 +128,13 @@ class LcdCommRevA(LcdComm):
         # Wait for display reset then reconnect
         time.sleep(5)
         self.openSerial()
+        self.ForgetFramebuffer()
 
     def Clear(self):
         self.SetOrientation(Orientation.PORTRAIT)  # Bug: orientation needs to be PORTRAIT before clearing
         self.SendCommand(Command.CLEAR, 0, 0, 0, 0)
         self.SetOrientation()  # Restore default orientation
+        self.ForgetFramebuffer()
 
     def ScreenOff(self):
         self.SendCommand(Command.SCREEN_OFF, 0, 0, 0, 0)
@@ -198,7 +200,7 @@ class LcdCommRevA(LcdComm):
         # serialize to little-endian
         return rgb565.newbyteorder('<').tobytes()
 
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
@@ -228,11 +230,17 @@ class LcdCommRevA(LcdComm):
         if image_width != image.size[0] or image_height != image.size[1]:
             image = image.crop((0, 0, image_width, image_height))
 
+        self.SendEncodedBitmap(self.imageToRGB565LE(image), x, y, image_width, image_height)
+
+    def EncodeBitmap(self, image: Image, x: int, y: int) -> bytes:
+        return self.imageToRGB565LE(image)
+
+    def SendEncodedBitmap(self, rgb565le: bytes, x: int, y: int, image_width: int, image_height: int):
+        width = self.get_width()
+
         (x0, y0) = (x, y)
         (x1, y1) = (x + image_width - 1, y + image_height - 1)
 
-        rgb565le = self.imageToRGB565LE(image)
-
         self.SendCommand(Command.DISPLAY_BITMAP, x0, y0, x1, y1)
 
         # Lock queue mutex then queue all the requests for the image data
@@ -195,7 +195,7 @@ class LcdCommRevB(LcdComm):
         else:
             self.SendCommand(Command.SET_ORIENTATION, payload=[OrientationValueRevB.ORIENTATION_LANDSCAPE])
 
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
@@ -27,7 +27,7 @@ import serial
 from PIL import Image
 from serial.tools.list_ports import comports
 
-from library.lcd.lcd_comm import Orientation, LcdComm
+from library.lcd.lcd_comm import Orientation, LcdComm, EncodedBitmapTransfer
 from library.log import logger
 
 
@@ -127,7 +127,7 @@ class SubRevision(Enum):
 
 
 # This class is for Turing Smart Screen 5" screens
-class LcdCommRevC(LcdComm):
+class LcdCommRevC(LcdComm, EncodedBitmapTransfer):
     def __init__(self, com_port: str = "AUTO", display_width: int = 480, display_height: int = 800,
                  update_queue: queue.Queue = None):
         logger.debug("HW revision: C")
@@ -216,6 +216,7 @@ class LcdCommRevC(LcdComm):
         # Wait for display reset then reconnect
         time.sleep(15)
         self.openSerial()
+        self.ForgetFramebuffer()
 
     def Clear(self):
         # This hardware does not implement a Clear command: display a blank image on the whole screen
@@ -262,7 +263,7 @@ class LcdCommRevC(LcdComm):
             b = Command.STARTMODE_DEFAULT.value + Padding.NULL.value + Command.NO_FLIP.value + SleepInterval.OFF.value
             self._send_command(Command.OPTIONS, payload=b)
 
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
@@ -287,14 +288,8 @@ class LcdCommRevC(LcdComm):
         assert image_width > 0, 'Image width must be > 0'
 
         if x == 0 and y == 0 and (image_width == self.get_width()) and (image_height == self.get_height()):
-            with self.update_queue_mutex:
-                self._send_command(Command.PRE_UPDATE_BITMAP)
-                self._send_command(Command.START_DISPLAY_BITMAP, padding=Padding.START_DISPLAY_BITMAP)
-                self._send_command(Command.DISPLAY_BITMAP)
-                self._send_command(Command.SEND_PAYLOAD,
-                                   payload=bytearray(self._generate_full_image(image, self.orientation)),
-                                   readsize=1024)
-                self._send_command(Command.QUERY_STATUS, readsize=1024)
+            self.SendEncodedBitmap(bytearray(self._generate_full_image(image, self.orientation)), x, y, image_width,
+                                   image_height)
         else:
             with self.update_queue_mutex:
                 img, pyd = self._generate_update_image(image, x, y, Count.Start, Command.UPDATE_BITMAP,
@@ -304,6 +299,20 @@ class LcdCommRevC(LcdComm):
                 self._send_command(Command.QUERY_STATUS, readsize=1024)
             Count.Start += 1
 
+    def EncodeBitmap(self, image: Image, x: int, y: int):
+        # Only full screen images have a payload that does not depend on the update counter
+        if x == 0 and y == 0 and image.size == (self.get_width(), self.get_height()):
+            return self._generate_full_image(image, self.orientation)
+        return None
+
+    def SendEncodedBitmap(self, data: bytes, x: int, y: int, image_width: int, image_height: int):
+        with self.update_queue_mutex:
+            self._send_command(Command.PRE_UPDATE_BITMAP)
+            self._send_command(Command.START_DISPLAY_BITMAP, padding=Padding.START_DISPLAY_BITMAP)
+            self._send_command(Command.DISPLAY_BITMAP)
+            self._send_command(Command.SEND_PAYLOAD, payload=data, readsize=1024)
+            self._send_command(Command.QUERY_STATUS, readsize=1024)
+
     @staticmethod
     def _generate_full_image(image: Image, orientation: Orientation = Orientation.PORTRAIT):
         if orientation == Orientation.PORTRAIT:
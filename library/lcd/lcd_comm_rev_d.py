@@ -93,6 +93,7 @@ class LcdCommRevD(LcdComm):
         color = 0xFFFF  # RGB565 White color
         color_bytes = bytearray(color.to_bytes(2))
         self.SendCommand(cmd=Command.DISPCOLOR, payload=color_bytes)
+        self.ForgetFramebuffer()
 
     def ScreenOff(self):
         # HW revision D does not implement a "ScreenOff" native command: using SetBrightness(0) instead
@@ -125,7 +126,7 @@ class LcdCommRevD(LcdComm):
         else:
             self.SendCommand(cmd=Command.SETORG)
 
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
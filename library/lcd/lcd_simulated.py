@@ -108,8 +108,9 @@ class LcdSimulated(LcdComm):
             self.screen_image = Image.new("RGB", (self.get_width(), self.get_height()), (255, 255, 255))
             self.screen_image.save("tmp", "PNG")
             shutil.copyfile("tmp", SCREENSHOT_FILE)
+        self.ForgetFramebuffer()
 
-    def DisplayPILImage(
+    def SendPILImage(
             self,
             image: Image,
             x: int = 0, y: int = 0,
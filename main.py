@@ -188,6 +188,9 @@ if __name__ == "__main__":
     # Initialize the display
     display.initialize_display()
 
+    # Decode the background regions behind transparent widgets
+    display.preload_background_crops()
+
     # Create all static images
     display.display_static_images()
 
@@ -1,15 +1,30 @@
+import csv
+import heapq
 import json
+import math
 import os
+import threading
+import re
+import socketserver
 import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
 from dotenv import load_dotenv
+import urllib3
 from influxdb_client import InfluxDBClient
 from PIL import Image
 from urllib.error import HTTPError, URLError
 from urllib.request import urlopen
 
-from library.lcd.lcd_comm import Orientation
+from library.lcd.lcd_comm import AssetStore, LcdComm, Orientation
 from library.lcd.lcd_comm_rev_a import LcdCommRevA
+from library.log import logger
 
 # Load environment variables at the start of your script
 load_dotenv()
@@ -32,6 +47,16 @@ LAST_IP_DETAILS = {
     "location_country_code": "",
     "isp": "Unknown",
 }
+# Public IP is re-checked every IP_CACHE_TTL seconds, ip-api is only queried when it changes.
+# Failed lookups are retried after IP_BACKOFF_BASE seconds, doubling up to IP_BACKOFF_MAX.
+IP_CACHE_TTL = float(os.getenv("IP_CACHE_TTL", "300"))
+IP_BACKOFF_BASE = float(os.getenv("IP_BACKOFF_BASE", "30"))
+IP_BACKOFF_MAX = float(os.getenv("IP_BACKOFF_MAX", "3600"))
+# Last known details are saved here so a restart doesn't show "Unknown"
+IP_CACHE_FILE = os.getenv("IP_CACHE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ip_details.json"))
+_IP_DETAILS_LOOKUP_IP = None  # Public IP that the cached location/ISP were looked up for
+_IP_NEXT_LOOKUP = 0.0  # time.monotonic() of the next allowed lookup
+_IP_LOOKUP_FAILURES = 0
 
 # Influx / host config
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "homelab")
@@ -42,6 +67,19 @@ INFLUXDB_SERVER_TAG = os.getenv("INFLUXDB_SERVER_TAG", os.getenv("INFLUXDB_HOST_
 SMALLSERVER_ALIAS = os.getenv("SMALLSERVER_ALIAS", os.getenv("SMALLSERVER_HOST", "smallserver"))
 BIGSERVER_ALIAS = os.getenv("BIGSERVER_ALIAS", os.getenv("BIGSERVER_HOST", "bigserver"))
 
+# Servers shown in the SERVERS table, as "LABEL=alias" pairs, e.g. SERVERS="SMALL=smallserver,BIG=bigserver,NAS=nas".
+# Two servers fit on the panel: with more, the table shows them two at a time, rotating every SERVERS_PAGE_INTERVAL s.
+SERVERS = [
+    (label.strip(), alias.strip())
+    for label, _, alias in (item.partition("=") for item in os.getenv("SERVERS", "").split(",") if item.strip())
+] or [("SMALL", SMALLSERVER_ALIAS), ("BIG", BIGSERVER_ALIAS)]
+SERVERS_PAGE_INTERVAL = float(os.getenv("SERVERS_PAGE_INTERVAL", "10"))
+
+# Dashboard pages shown in turn, every PAGE_INTERVAL seconds, e.g. PAGES=overview,servers,storage
+# (overview is the default layout; servers and storage show one row per server/NVME drive with its history)
+PAGES = [page.strip() for page in os.getenv("PAGES", "overview").split(",") if page.strip()]
+PAGE_INTERVAL = float(os.getenv("PAGE_INTERVAL", "20"))
+
 SERVER_TEMP_MEASUREMENT = os.getenv("SERVER_TEMP_MEASUREMENT", "sensors")
 SERVER_TEMP_FIELD = os.getenv("SERVER_TEMP_FIELD", "temp_input")
 SERVER_TEMP_CHIP = os.getenv("SERVER_TEMP_CHIP", "coretemp-isa-0000")
@@ -56,6 +94,80 @@ NVME_TEMP_FEATURE = os.getenv("NVME_TEMP_FEATURE", "composite")
 NVME_0100_CHIP = os.getenv("NVME_0100_CHIP", "nvme-pci-0100")
 NVME_8100_CHIP = os.getenv("NVME_8100_CHIP", "nvme-pci-8100")
 
+# Where the screen metrics come from: "influx" (Flux queries, default) or "prometheus" (Prometheus HTTP API, metric
+# names built from the InfluxDB measurement and field as Telegraf's prometheus_client output does: `<measurement>_<field>`)
+METRICS_BACKEND = os.getenv("METRICS_BACKEND", "influx")
+PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://localhost:9090")
+PROMETHEUS_TIMEOUT_MS = int(os.getenv("PROMETHEUS_TIMEOUT_MS", "10000"))
+# Measurement of the internet speedtest fields in Prometheus (they are matched in any measurement in InfluxDB)
+PROMETHEUS_INTERNET_MEASUREMENT = os.getenv("PROMETHEUS_INTERNET_MEASUREMENT", "speedtest")
+
+# Influx connection: the client is kept open between refreshes so sockets are reused
+INFLUXDB_TIMEOUT_MS = int(os.getenv("INFLUXDB_TIMEOUT_MS", "10000"))
+# Ping the server before reusing a connection that has been idle for longer than this
+INFLUXDB_HEALTH_CHECK_INTERVAL = float(os.getenv("INFLUXDB_HEALTH_CHECK_INTERVAL", "60"))
+
+
+def _parse_section_values(value: str) -> dict:
+    # "internet=8,ups=3" -> {"internet": 8.0, "ups": 3.0}
+    return {
+        section.strip(): float(number)
+        for section, _, number in (item.partition("=") for item in value.split(",") if item.strip())
+    }
+
+
+# While the metrics source is failing, queries are skipped for INFLUXDB_BACKOFF_BASE seconds, doubling up to
+# INFLUXDB_BACKOFF_MAX
+INFLUXDB_BACKOFF_BASE = float(os.getenv("INFLUXDB_BACKOFF_BASE", "5"))
+INFLUXDB_BACKOFF_MAX = float(os.getenv("INFLUXDB_BACKOFF_MAX", "300"))
+# Values not confirmed by a successful fetch (or push) for longer than this (seconds) are drawn dimmed. This is about
+# the metrics source being unreachable, not the sample's age: series sampled less often than this (e.g. speedtests)
+# stay bright while a query returns them
+STALE_AFTER = float(os.getenv("STALE_AFTER", "180"))
+
+# Push ingestion: listen for line protocol sent by Telegraf (UDP, and/or HTTP compatible with InfluxDB /write and
+# /api/v2/write) instead of polling InfluxDB. 0 disables a listener. While a listener is enabled, InfluxDB is only
+# queried once at startup, unless PUSH_POLL_INFLUX=1.
+PUSH_LISTEN_HOST = os.getenv("PUSH_LISTEN_HOST", "0.0.0.0")
+PUSH_UDP_PORT = int(os.getenv("PUSH_UDP_PORT", "0"))
+PUSH_HTTP_PORT = int(os.getenv("PUSH_HTTP_PORT", "0"))
+PUSH_POLL_INFLUX = os.getenv("PUSH_POLL_INFLUX", "0") == "1"
+# Larger HTTP write requests (after decompression) are rejected
+PUSH_MAX_BODY = int(os.getenv("PUSH_MAX_BODY", str(4 * 1024 * 1024)))
+
+# Fetch mode: "batched" sends one query for the whole screen, "concurrent" sends one query per section in parallel.
+# In concurrent mode each query has its own deadline (seconds), e.g. FETCH_DEADLINES="internet=8,ups=3";
+# a section that misses its deadline keeps its last-known values for this refresh.
+FETCH_MODE = os.getenv("FETCH_MODE", "batched")
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "4"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "5"))
+FETCH_DEADLINES = _parse_section_values(os.getenv("FETCH_DEADLINES", ""))
+
+# Each section is fetched in the background and redrawn on its own interval (seconds).
+# FETCH_INTERVAL is the default for internet/servers, RENDER_INTERVAL is the clock tick.
+# Override per section with e.g. REFRESH_INTERVALS="ups=2,nvme=120" (0 disables a section's refresh).
+FETCH_INTERVAL = float(os.getenv("FETCH_INTERVAL", "15"))
+RENDER_INTERVAL = float(os.getenv("RENDER_INTERVAL", "1"))
+# The clock ticks this long (seconds) after each wall-clock second, so that a wake-up slightly early never shows the
+# previous second
+CLOCK_TICK_OFFSET = 0.03
+REFRESH_INTERVALS = {
+    "clock": RENDER_INTERVAL,
+    "internet": FETCH_INTERVAL,
+    "ups": 5,
+    "servers": FETCH_INTERVAL,
+    "nvme": 60,
+    "wan": 60,
+    "history": float(os.getenv("HISTORY_WINDOW", "60")),
+    **_parse_section_values(os.getenv("REFRESH_INTERVALS", "")),
+}
+
+# Sparkline history: the last HISTORY_POINTS averages over HISTORY_WINDOW seconds of each series in HISTORY_KEYS.
+# It is backfilled once, then only windows completed since the last one held are queried (every HISTORY_WINDOW).
+HISTORY_WINDOW = int(REFRESH_INTERVALS["history"]) or 60
+HISTORY_POINTS = int(os.getenv("HISTORY_POINTS", "48"))
+HISTORY_KEYS = ["latency", "load_percent", "cpu_temp:{}", "nvme_0100_temp", "nvme_8100_temp"]
+
 # Layout constants (320x480 portrait)
 # Keep consistent spacing:
 # - 40px between last line of a section and next section header
@@ -78,6 +190,49 @@ ROW_GAP = 20
 FONT_TABLE = "roboto/Roboto-Regular.ttf"
 FONT_TABLE_BOLD = "roboto/Roboto-Bold.ttf"
 
+# Fixed regions for dynamic values (prevents leftover characters without full clears)
+FULL_LINE_W = 315
+FULL_LINE_H = ROW_H
+CELL_W = 70
+SMALL_CELL_X = SMALL_RIGHT_X - CELL_W
+BIG_CELL_X = BIG_RIGHT_X - CELL_W
+# SERVERS table columns: (right edge, header width, value cell x)
+SERVER_COLUMNS = [(SMALL_RIGHT_X, 100, SMALL_CELL_X), (BIG_RIGHT_X, CELL_W, BIG_CELL_X)]
+
+# Draw numeric cells (clock, temperatures, percentages) from a glyph atlas instead of rendering them with PIL
+GLYPH_ATLAS = os.getenv("GLYPH_ATLAS", "1") == "1"
+
+# Full-screen background under the static layer (plain black if the file doesn't exist)
+BACKGROUND_IMAGE = "black_bg.png"
+# First frame pre-encoded in the display format, cached on disk by content (empty to disable)
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "asset_cache"))
+
+# Detail pages (servers/storage): one block per row, its value(s) then its history graph below
+DETAIL_Y = INTERNET_Y + HEADER_TO_FIRST_ROW_GAP
+DETAIL_BLOCK_H = 62
+DETAIL_GRAPH_H = 28
+DETAIL_ROWS = (480 - DETAIL_Y) // DETAIL_BLOCK_H
+DETAIL_CPU_X = 130
+DETAIL_VALUE_W = 90
+
+# Sparklines, on the right of the section headers
+SPARKLINE_X = 190
+SPARKLINE_W = 125
+SPARKLINE_H = 22
+
+# Layout Y positions (constant)
+INTERNET_LAST_LINE_Y = INTERNET_Y + HEADER_TO_FIRST_ROW_GAP + 3 * ROW_GAP
+
+UPS_Y = INTERNET_LAST_LINE_Y + SECTION_TO_SECTION_GAP
+UPS_ROWS = 4
+SERVERS_Y = (UPS_Y + HEADER_TO_FIRST_ROW_GAP + (UPS_ROWS - 1) * ROW_GAP) + SECTION_TO_SECTION_GAP
+
+ROW1_Y = SERVERS_Y + HEADER_TO_FIRST_ROW_GAP
+ROW2_Y = ROW1_Y + ROW_GAP
+
+NVME_Y = ROW2_Y + SECTION_TO_SECTION_GAP
+NVME_LINE_Y = NVME_Y + HEADER_TO_FIRST_ROW_GAP
+
 
 def get_public_ip():
     try:
@@ -88,12 +243,54 @@ def get_public_ip():
         return "Unknown"
 
 
+def _load_ip_details():
+    # Start warm: restore the last known WAN details saved by a previous run
+    global LAST_IP_DETAILS, _IP_DETAILS_LOOKUP_IP
+    try:
+        with open(IP_CACHE_FILE, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        LAST_IP_DETAILS = {**LAST_IP_DETAILS, **saved.get("ip_details", {})}
+        _IP_DETAILS_LOOKUP_IP = saved.get("lookup_ip")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+
+def _save_ip_details():
+    try:
+        with open(IP_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"ip_details": LAST_IP_DETAILS, "lookup_ip": _IP_DETAILS_LOOKUP_IP}, f)
+    except OSError as e:
+        logger.warning(f"Cannot save WAN/IP details to {IP_CACHE_FILE}: {e}")
+
+
+def _ip_lookup_done(success: bool):
+    # Schedule the next lookup: after the TTL on success, with exponential backoff on failures
+    global _IP_NEXT_LOOKUP, _IP_LOOKUP_FAILURES
+    if success:
+        _IP_LOOKUP_FAILURES = 0
+        delay = IP_CACHE_TTL
+    else:
+        _IP_LOOKUP_FAILURES += 1
+        delay = min(IP_BACKOFF_MAX, IP_BACKOFF_BASE * 2 ** (_IP_LOOKUP_FAILURES - 1))
+    _IP_NEXT_LOOKUP = time.monotonic() + delay
+
+
 def get_ip_details():
-    global LAST_IP_DETAILS
+    global LAST_IP_DETAILS, _IP_DETAILS_LOOKUP_IP
     cached_details = LAST_IP_DETAILS.copy()
 
+    # Cached details are still fresh (or we are backing off after failures)
+    if time.monotonic() < _IP_NEXT_LOOKUP:
+        return cached_details
+
     ip = get_public_ip()
     if ip == "Unknown":
+        _ip_lookup_done(success=False)
+        return cached_details
+
+    # Location/ISP only change with the public IP: don't query ip-api again for the same IP
+    if ip == _IP_DETAILS_LOOKUP_IP:
+        _ip_lookup_done(success=True)
         return cached_details
 
     updated_details = cached_details.copy()
@@ -103,6 +300,7 @@ def get_ip_details():
         url = IP_API_URL_TEMPLATE.format(ip=ip)
     except KeyError:
         LAST_IP_DETAILS = updated_details
+        _ip_lookup_done(success=True)
         return updated_details
 
     try:
@@ -110,10 +308,12 @@ def get_ip_details():
             payload = json.loads(response.read().decode("utf-8"))
     except (URLError, HTTPError, TimeoutError, json.JSONDecodeError):
         LAST_IP_DETAILS = updated_details
+        _ip_lookup_done(success=False)
         return updated_details
 
     if payload.get("status") != "success":
         LAST_IP_DETAILS = updated_details
+        _ip_lookup_done(success=False)
         return updated_details
 
     updated_details["location_city"] = payload.get("city") or "Unknown"
@@ -121,87 +321,591 @@ def get_ip_details():
     updated_details["isp"] = payload.get("isp") or "Unknown"
 
     LAST_IP_DETAILS = updated_details
+    _IP_DETAILS_LOOKUP_IP = ip
+    _save_ip_details()
+    _ip_lookup_done(success=True)
     return updated_details
 
 
-def get_system_data():
-    # Configure InfluxDB connection
-    client = InfluxDBClient(
-        url=os.getenv('INFLUXDB_URL'),
-        token=os.getenv('INFLUXDB_TOKEN'),
-        org=os.getenv('INFLUXDB_ORG')
-    )
+# Every value shown on the screen, fetched in one batched Flux query.
+# `measurement=None` matches the field in any measurement (the internet speedtest fields).
+# A tag given as a list of values makes a grouped series: it is queried once for all the values, grouped by that tag,
+# and fanned out to one data key per value (`key` is then a format string, e.g. "cpu_temp:{}").
+Series = namedtuple("Series", ["key", "section", "start", "measurement", "field", "tags"])
+
+INTERNET_FIELDS = ["download", "upload", "location", "latency", "isp"]
+UPS_FIELDS = [
+    "ups_status",
+    "load_percent",
+    "battery_charge_percent",
+    "battery_charger_status",
+    "battery_voltage",
+    "input_voltage",
+    "output_voltage",
+    "internal_temp",
+]
+
+
+# NVME drives: (label, data key)
+NVME_DRIVES = [("UMIS", "nvme_0100_temp"), ("990 Evo", "nvme_8100_temp")]
+
+
+def _nvme_temp_tags(chip_value: str) -> dict:
+    return {INFLUXDB_SERVER_TAG: NVME_SERVER_ALIAS, "chip": chip_value, "feature": NVME_TEMP_FEATURE}
+
+
+SCREEN_SERIES = (
+    [Series(field, "internet", "-1h", None, field, {}) for field in INTERNET_FIELDS]
+    + [Series(field, "ups", "-1m", "upsd", field, {}) for field in UPS_FIELDS]
+    + [
+        Series("cpu_temp:{}", "servers", "-5m", SERVER_TEMP_MEASUREMENT, SERVER_TEMP_FIELD,
+               {INFLUXDB_SERVER_TAG: [alias for _, alias in SERVERS],
+                "chip": SERVER_TEMP_CHIP, "feature": SERVER_TEMP_FEATURE}),
+        Series("ram_used_percent:{}", "servers", "-5m", SERVER_RAM_MEASUREMENT, SERVER_RAM_FIELD,
+               {INFLUXDB_SERVER_TAG: [alias for _, alias in SERVERS]}),
+        Series("nvme_0100_temp", "nvme", "-5m", SERVER_TEMP_MEASUREMENT, SERVER_TEMP_FIELD,
+               _nvme_temp_tags(NVME_0100_CHIP)),
+        Series("nvme_8100_temp", "nvme", "-5m", SERVER_TEMP_MEASUREMENT, SERVER_TEMP_FIELD,
+               _nvme_temp_tags(NVME_8100_CHIP)),
+    ]
+)
 
-    # Internet metrics query
-    internet_query = f'''
-    from(bucket: "{INFLUXDB_BUCKET}")
-    |> range(start: -1h)
-    |> filter(fn: (r) => r["_field"] == "download" or r["_field"] == "upload" or r["_field"] == "location" or r["_field"] == "latency" or r["_field"] == "isp")
-    |> last()
-    '''
 
-    # UPS metrics query
-    ups_query = f'''
-    from(bucket: "{INFLUXDB_BUCKET}")
-    |> range(start: -1m)
-    |> filter(fn: (r) => r["_measurement"] == "upsd")
-    |> filter(fn: (r) => r["_field"] == "ups_status" or 
-                         r["_field"] == "load_percent" or 
-                         r["_field"] == "battery_charge_percent" or 
-                         r["_field"] == "battery_charger_status" or 
-                         r["_field"] == "battery_voltage" or 
-                         r["_field"] == "input_voltage" or 
-                         r["_field"] == "output_voltage" or 
-                         r["_field"] == "internal_temp")
-    |> last()
+HISTORY_SERIES = [series for series in SCREEN_SERIES if series.key in HISTORY_KEYS]
+
+
+def _series_predicate(series: Series) -> str:
+    clauses = []
+    if series.measurement is not None:
+        clauses.append(f'r["_measurement"] == {json.dumps(series.measurement)}')
+    clauses.append(f'r["_field"] == {json.dumps(series.field)}')
+    for tag, value in series.tags.items():
+        if isinstance(value, list):
+            clauses.append(f'contains(value: r[{json.dumps(tag)}], set: {json.dumps(value)})')
+        else:
+            clauses.append(f'r[{json.dumps(tag)}] == {json.dumps(value)}')
+    return "(" + " and ".join(clauses) + ")"
+
+
+def _group_tag(series: Series):
+    # Tag a grouped series is fanned out on, None for a single series
+    for tag, value in series.tags.items():
+        if isinstance(value, list):
+            return tag
+    return None
+
+
+def series_keys(series: Series) -> list:
+    # Data keys filled by a series
+    tag = _group_tag(series)
+    if tag is None:
+        return [series.key]
+    return [series.key.format(value) for value in series.tags[tag]]
+
+
+def _sub_stream(index: int, start: str, group: list, group_by: str = None) -> str:
+    predicate = "\n        or ".join(_series_predicate(series) for series in group)
+    # Only return the columns needed to map a row back to its series
+    columns = ["_time", "_value", "_field", "_measurement"]
+    columns += sorted({tag for series in group for tag in series.tags})
+    if group_by is None:
+        grouping = ""
+    else:
+        # Latest sample of each series, then keep the latest one per group (one row per tag value)
+        grouping = f"""
+        |> group(columns: [{json.dumps(group_by)}])
+        |> sort(columns: ["_time"])
+        |> last()"""
+    return f'''
+    s{index} = from(bucket: "{INFLUXDB_BUCKET}")
+        |> range(start: {start})
+        |> filter(fn: (r) => {predicate})
+        |> last(){grouping}
+        |> keep(columns: {json.dumps(columns)})
     '''
 
-    def _query_last_value(query: str):
-        tables = client.query_api().query(query)
-        for table in tables:
-            for record in table.records:
-                return record.get_value()
-        return None
 
-    def _server_eq(server_alias: str) -> str:
-        return f'r["{INFLUXDB_SERVER_TAG}"] == {json.dumps(server_alias)}'
-
-    def _server_cpu_temp_query(host_value: str) -> str:
-        return f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-        |> range(start: -5m)
-        |> filter(fn: (r) => r["_measurement"] == "{SERVER_TEMP_MEASUREMENT}")
-        |> filter(fn: (r) => r["_field"] == "{SERVER_TEMP_FIELD}")
-        |> filter(fn: (r) => {_server_eq(host_value)})
-        |> filter(fn: (r) => r["chip"] == "{SERVER_TEMP_CHIP}")
-        |> filter(fn: (r) => r["feature"] == "{SERVER_TEMP_FEATURE}")
-        |> last()
-        '''
-
-    def _server_ram_used_query(host_value: str) -> str:
-        return f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-        |> range(start: -5m)
-        |> filter(fn: (r) => r["_measurement"] == "{SERVER_RAM_MEASUREMENT}")
-        |> filter(fn: (r) => r["_field"] == "{SERVER_RAM_FIELD}")
-        |> filter(fn: (r) => {_server_eq(host_value)})
-        |> last()
-        '''
-
-    def _server_nvme_temp_query(server_alias: str, chip_value: str) -> str:
-        return f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-        |> range(start: -5m)
-        |> filter(fn: (r) => r["_measurement"] == "{SERVER_TEMP_MEASUREMENT}")
-        |> filter(fn: (r) => r["_field"] == "{SERVER_TEMP_FIELD}")
-        |> filter(fn: (r) => {_server_eq(server_alias)})
-        |> filter(fn: (r) => r["chip"] == "{chip_value}")
-        |> filter(fn: (r) => r["feature"] == "{NVME_TEMP_FEATURE}")
-        |> last()
-        '''
-
-    # Initialize values
-    data = {
+def _flux_result(names) -> str:
+    # Single response made of the named sub-streams. Flux's union() needs at least two streams: one is yielded as-is
+    if len(names) == 1:
+        return f"\n    {names[0]} |> yield()\n"
+    return f"\n    union(tables: [{', '.join(names)}])\n"
+
+
+def build_screen_query(series_list) -> str:
+    # One sub-stream per range start (each ending in `last()`) plus one per grouped series,
+    # unioned into a single response
+    by_start = {}
+    grouped = []
+    for series in series_list:
+        if _group_tag(series) is None:
+            by_start.setdefault(series.start, []).append(series)
+        else:
+            grouped.append(series)
+
+    streams = [_sub_stream(index, start, group) for index, (start, group) in enumerate(by_start.items())]
+    for series in grouped:
+        streams.append(_sub_stream(len(streams), series.start, [series], _group_tag(series)))
+    return "".join(streams) + _flux_result([f"s{index}" for index in range(len(streams))])
+
+
+def _series_matches(series: Series, values: dict) -> bool:
+    if series.measurement is not None and values.get("_measurement") != series.measurement:
+        return False
+    if values.get("_field") != series.field:
+        return False
+    return all(values.get(tag) in value if isinstance(value, list) else values.get(tag) == value
+               for tag, value in series.tags.items())
+
+
+def _series_key(series: Series, values: dict) -> str:
+    tag = _group_tag(series)
+    return series.key if tag is None else series.key.format(values.get(tag))
+
+
+def _flux_value(value: str, datatype: str):
+    if datatype == "double":
+        return float(value)
+    if datatype in ("long", "unsignedLong"):
+        return int(value)
+    if datatype == "boolean":
+        return value == "true"
+    return value
+
+
+def iter_flux_csv(lines):
+    """Parse an annotated CSV Flux response incrementally, yielding one {column: value} dict per data row.
+
+    `_value` is converted according to the `#datatype` annotation, the other columns are kept as strings.
+    """
+    datatypes, defaults, header = [], [], None
+    for row in csv.reader(lines):
+        if not row or not any(row):
+            # Blank line: a new table (with its own annotations and header) follows
+            header = None
+        elif row[0] == "#datatype":
+            datatypes = row
+        elif row[0] == "#default":
+            defaults = row
+        elif row[0].startswith("#"):
+            continue
+        elif header is None:
+            header = row
+        else:
+            values = {}
+            for index, column in enumerate(header):
+                value = row[index] if index < len(row) else ""
+                if value == "" and index < len(defaults):
+                    value = defaults[index]
+                if column == "_value" and value != "":
+                    value = _flux_value(value, datatypes[index] if index < len(datatypes) else "string")
+                values[column] = value
+            yield values
+
+
+def _parse_flux_time(value) -> float:
+    # RFC3339 `_time` (e.g. 2024-01-01T00:04:00.123456789Z) to epoch seconds; now if missing or unparsable
+    match = re.match(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:\d\d)$", value or "")
+    if not match:
+        return time.time()
+    timestamp, fraction, zone = match.groups()
+    parsed = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
+    offset = timedelta(0) if zone == "Z" else timedelta(hours=int(zone[1:3]), minutes=int(zone[4:6]))
+    if zone.startswith("-"):
+        offset = -offset
+    return parsed.replace(tzinfo=timezone(offset)).timestamp() + float(fraction or 0)
+
+
+def map_records(series_list, records, data: dict, sample_times: dict = None):
+    # Map each returned row back to the data key(s) of the series it belongs to (and the time it was sampled at).
+    # Stops reading as soon as every series has a value.
+    remaining = {key for series in series_list for key in series_keys(series)}
+    for values in records:
+        for series in series_list:
+            if _series_matches(series, values):
+                key = _series_key(series, values)
+                data[key] = values.get("_value")
+                if sample_times is not None:
+                    sample_times[key] = _parse_flux_time(values.get("_time"))
+                remaining.discard(key)
+        if not remaining:
+            break
+
+
+def build_history_query(ranges, stop: int, window: int) -> str:
+    # One aggregated sub-stream (mean per window) per (series, start), unioned into a single response
+    streams = []
+    for index, (series, start) in enumerate(ranges):
+        columns = ["_time", "_value", "_field", "_measurement"] + sorted(series.tags)
+        streams.append(f'''
+    h{index} = from(bucket: "{INFLUXDB_BUCKET}")
+        |> range(start: {start}, stop: {stop})
+        |> filter(fn: (r) => {_series_predicate(series)})
+        |> aggregateWindow(every: {window}s, fn: mean, createEmpty: false)
+        |> keep(columns: {json.dumps(columns)})
+    ''')
+    return "".join(streams) + _flux_result([f"h{index}" for index in range(len(streams))])
+
+
+class MetricsSource(ABC):
+    """Backend the screen metrics are read from (see METRICS_BACKEND).
+
+    Implementations answer each call with a single round trip over a connection kept alive between refreshes, so
+    the whole layout is fed without per-cell requests.
+    """
+
+    name = "metrics source"
+
+    @abstractmethod
+    def query_latest(self, series_list):
+        # Latest value of each series: ({data key: value}, {data key: sample time (epoch seconds)})
+        pass
+
+    @abstractmethod
+    def query_history(self, ranges, stop: int, window: int):
+        # One point per `window` seconds for each (series, start) in `ranges`, up to `stop` (epoch seconds):
+        # iterable of (data key, window end time, value)
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # Stale keep-alive socket, refused connection or server restart. Timeouts are not: the query is only slow, and
+    # running it again on a new connection would double the wait
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        return _is_connection_error(error.reason)
+    return isinstance(error, (urllib3.exceptions.ProtocolError, urllib3.exceptions.NewConnectionError, ConnectionError))
+
+
+class InfluxConnection(MetricsSource):
+    """Long-lived InfluxDB client/query API shared by the whole screen loop.
+
+    urllib3 keeps the HTTP connections of the client's pool alive between refreshes. The connection is
+    health-checked after being idle, and transparently re-created (and the query retried once) on connection errors.
+    """
+
+    name = "InfluxDB"
+
+    def __init__(self, url=None, token=None, org=None):
+        self.url = url or os.getenv('INFLUXDB_URL')
+        self.token = token or os.getenv('INFLUXDB_TOKEN')
+        self.org = org or os.getenv('INFLUXDB_ORG')
+        self.client = None
+        self.query_api = None
+        # Number of times the client had to be re-created after the first connection
+        self.reconnects = 0
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.client is not None:
+            self.reconnects += 1
+            logger.warning(f"Reconnecting to InfluxDB (reconnects: {self.reconnects})")
+            self._close_client()
+        self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org, timeout=INFLUXDB_TIMEOUT_MS)
+        self.query_api = self.client.query_api()
+
+    def _close_client(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+        self.client = None
+        self.query_api = None
+
+    def _get_query_api(self):
+        with self._lock:
+            if self.client is None:
+                self._connect()
+            elif time.monotonic() - self._last_used > INFLUXDB_HEALTH_CHECK_INTERVAL and not self.client.ping():
+                self._connect()
+            return self.query_api
+
+    def query_raw(self, query: str):
+        # Returns the unread HTTP response (annotated CSV), to be parsed as a stream
+        query_api = self._get_query_api()
+        try:
+            response = query_api.query_raw(query)
+        except (urllib3.exceptions.HTTPError, OSError) as e:
+            if not _is_connection_error(e):
+                raise
+            # Stale keep-alive socket or server restart: reconnect and retry once
+            logger.debug(f"InfluxDB query failed ({e}), retrying on a new connection")
+            with self._lock:
+                # Queries run concurrently: only reconnect if no other thread has already replaced the failed client
+                if self.query_api is query_api or self.client is None:
+                    self._connect()
+                query_api = self.query_api
+            response = query_api.query_raw(query)
+        self._last_used = time.monotonic()
+        return response
+
+    def _query_csv(self, query: str):
+        # Stream the CSV response: no FluxTable/FluxRecord objects, only the needed values are kept
+        response = self.query_raw(query)
+        try:
+            yield from iter_flux_csv(line.decode("utf-8") for line in response)
+        finally:
+            # Discard whatever was not parsed, so the connection goes back to the keep-alive pool
+            response.drain_conn()
+            response.release_conn()
+
+    def query_latest(self, series_list):
+        values, sample_times = {}, {}
+        records = self._query_csv(build_screen_query(series_list))
+        try:
+            map_records(series_list, records, values, sample_times)
+        finally:
+            records.close()
+        return values, sample_times
+
+    def query_history(self, ranges, stop: int, window: int):
+        points = []
+        for values in self._query_csv(build_history_query(ranges, stop, window)):
+            for series, _ in ranges:
+                if _series_matches(series, values):
+                    points.append((_series_key(series, values), _parse_flux_time(values.get("_time")),
+                                   values.get("_value")))
+        return points
+
+    def close(self):
+        with self._lock:
+            if self.client is not None:
+                self._close_client()
+
+
+def _prometheus_measurement(series: Series) -> str:
+    return PROMETHEUS_INTERNET_MEASUREMENT if series.measurement is None else series.measurement
+
+
+def prometheus_metric_name(series: Series) -> str:
+    # Telegraf's prometheus_client output names metrics `<measurement>_<field>` (invalid characters replaced by `_`)
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", f"{_prometheus_measurement(series)}_{series.field}")
+
+
+class PrometheusSource(MetricsSource):
+    """Reads the screen metrics from the Prometheus HTTP API.
+
+    Every series is fetched with one instant query selecting all their metric names at once
+    (`{__name__=~"a|b|..."}`); labels are matched against the series tags locally. Requests go through a urllib3
+    pool, so the connection is kept alive between refreshes. String fields (e.g. UPS status) don't exist in
+    Prometheus and keep their defaults. The latest sample is looked up within Prometheus' lookback window (5 min by
+    default) rather than each series' own range; its time comes from `timestamp()`, in the same response.
+    """
+
+    name = "Prometheus"
+
+    def __init__(self, url=None):
+        self.url = (url or PROMETHEUS_URL).rstrip("/")
+        timeout = PROMETHEUS_TIMEOUT_MS / 1000
+        self.http = urllib3.PoolManager(maxsize=FETCH_MAX_WORKERS, retries=urllib3.Retry(total=1, backoff_factor=0),
+                                        timeout=urllib3.Timeout(total=timeout))
+
+    def _selector(self, series_list) -> str:
+        names = sorted({prometheus_metric_name(series) for series in series_list})
+        return '{__name__=~"' + "|".join(names) + '"}'
+
+    def _query(self, path: str, fields: dict) -> list:
+        # POST (form-encoded) so a long selector doesn't hit URL length limits
+        response = self.http.request_encode_body("POST", self.url + path, fields=fields, encode_multipart=False)
+        if response.status != 200:
+            raise RuntimeError(f"Prometheus query failed: HTTP {response.status} {response.data[:200]!r}")
+        body = json.loads(response.data)
+        if body.get("status") != "success":
+            raise RuntimeError(f"Prometheus query failed: {body.get('error')}")
+        return body["data"]["result"]
+
+    @staticmethod
+    def _rows(series_list, metric: dict):
+        # Matching (series, data key) for a returned metric, mapped back to the InfluxDB measurement/field/tags model
+        name = metric.get("__name__", "")
+        for series in series_list:
+            if name == prometheus_metric_name(series):
+                values = {**metric, "_measurement": _prometheus_measurement(series), "_field": series.field}
+                if _series_matches(series, values):
+                    yield _series_key(series, values)
+
+    def query_latest(self, series_list):
+        # An instant query returns the evaluation time with each value: the time of the samples is queried with
+        # timestamp() in the same request, labelled with the name of the metric it belongs to (`sample_of`)
+        selector = self._selector(series_list)
+        query = f'{selector} or timestamp(label_replace({selector}, "sample_of", "$1", "__name__", "(.+)"))'
+        results = self._query("/api/v1/query", {"query": query})
+        sampled = {}
+        for result in results:
+            labels = dict(result["metric"])
+            name = labels.pop("sample_of", None)
+            if name is not None:
+                sampled[frozenset({**labels, "__name__": name}.items())] = float(result["value"][1])
+
+        values, sample_times = {}, {}
+        for result in results:
+            if "sample_of" in result["metric"]:
+                continue
+            evaluated_at, value = result["value"]
+            sampled_at = sampled.get(frozenset(result["metric"].items()), float(evaluated_at))
+            for key in self._rows(series_list, result["metric"]):
+                if sampled_at >= sample_times.get(key, 0):
+                    values[key] = float(value)
+                    sample_times[key] = sampled_at
+        return values, sample_times
+
+    def query_history(self, ranges, stop: int, window: int):
+        # One sample per step (the value at the end of each window), from the earliest start requested
+        series_list = [series for series, _ in ranges]
+        start = min(start for _, start in ranges) + window
+        fields = {"query": self._selector(series_list), "start": str(start), "end": str(stop), "step": f"{window}s"}
+        points = []
+        for result in self._query("/api/v1/query_range", fields):
+            for key in self._rows(series_list, result["metric"]):
+                points.extend((key, float(sampled_at), float(value)) for sampled_at, value in result["values"])
+        return sorted(points, key=lambda point: point[1])
+
+    def close(self):
+        self.http.clear()
+
+
+def create_metrics_source() -> MetricsSource:
+    if METRICS_BACKEND == "prometheus":
+        return PrometheusSource()
+    return InfluxConnection()
+
+
+class MetricStore:
+    """Last-known-good value of each metric, with the time it was sampled at and the time it was last confirmed by a
+    successful fetch (epoch seconds)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {}
+        self.sample_times = {}
+        self.confirmed_times = {}
+
+    def update(self, values: dict, sample_times: dict):
+        now = time.time()
+        with self._lock:
+            self.values.update(values)
+            self.sample_times.update(sample_times)
+            self.confirmed_times.update(dict.fromkeys(values, now))
+
+    def confirm(self, keys):
+        # The source of these values is alive, even though it sent nothing new for them
+        now = time.time()
+        with self._lock:
+            self.confirmed_times.update(dict.fromkeys((key for key in keys if key in self.values), now))
+
+    def last_known(self, keys) -> dict:
+        with self._lock:
+            return {key: self.values[key] for key in keys if key in self.values}
+
+    def get_sample_times(self) -> dict:
+        with self._lock:
+            return dict(self.sample_times)
+
+    def get_confirmed_times(self) -> dict:
+        with self._lock:
+            return dict(self.confirmed_times)
+
+
+class CircuitBreaker:
+    """Stops calling a failing service: after each consecutive failure, calls are skipped for an exponentially
+    growing delay, so an outage doesn't cost a timeout on every refresh."""
+
+    def __init__(self, base_delay: float, max_delay: float, name: str = "InfluxDB"):
+        self.name = name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.open_until = 0.0  # time.monotonic() until which calls are skipped
+
+    def allow(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def success(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def failure(self):
+        self.failures += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        self.open_until = time.monotonic() + delay
+        logger.warning(f"{self.name} unavailable ({self.failures} consecutive failures), next try in {delay:g}s")
+
+
+# Last successfully fetched values, used when a query fails, misses its deadline, or returns no sample for a series
+METRIC_STORE = MetricStore()
+SOURCE_BREAKER = CircuitBreaker(INFLUXDB_BACKOFF_BASE, INFLUXDB_BACKOFF_MAX,
+                                "Prometheus" if METRICS_BACKEND == "prometheus" else "InfluxDB")
+_FETCH_POOL = None
+
+
+class SeriesHistory:
+    """Fixed-size history of the sparkline series: one point (mean) per completed window, oldest first.
+
+    The first fetch backfills the whole history with `aggregateWindow`; later fetches only ask for the windows
+    completed after the last point held, so keeping the graphs up to date costs one small query per window.
+    """
+
+    def __init__(self, series_list, size: int = HISTORY_POINTS, window: int = HISTORY_WINDOW):
+        self.series_list = series_list
+        self.size = size
+        self.window = window
+        self._lock = threading.Lock()
+        # { key: ring buffer of (window end time (epoch seconds), value) }, dropping the oldest point once full
+        self.points = {key: deque(maxlen=size) for series in series_list for key in series_keys(series)}
+
+    def last_time(self, key: str):
+        with self._lock:
+            points = self.points.get(key)
+            return points[-1][0] if points else None
+
+    def add(self, key: str, sampled_at: float, value):
+        # Points are only appended in time order: anything not newer than the last point is ignored
+        with self._lock:
+            points = self.points.get(key)
+            if points is None or value is None or (points and sampled_at <= points[-1][0]):
+                return
+            points.append((sampled_at, float(value)))
+
+    def values(self, key: str) -> list:
+        # Oldest first, as expected by LcdComm.DisplayLineGraph
+        with self._lock:
+            return [value for _, value in self.points.get(key, ())]
+
+    def pending_ranges(self, now: float = None):
+        # ([(series, start)], stop): the series with windows completed after their last point held, and the end of
+        # the last completed window. Only completed windows are requested, so a point never has to be replaced later.
+        now = time.time() if now is None else now
+        stop = int(now // self.window * self.window)
+        backfill = stop - self.size * self.window
+        ranges = []
+        for series in self.series_list:
+            held = [self.last_time(key) for key in series_keys(series)]
+            start = int(min(backfill if last is None else last for last in held))
+            if start < stop:
+                ranges.append((series, start))
+        return ranges, stop
+
+    def fetch(self, source: MetricsSource) -> bool:
+        # Returns True when points were added
+        ranges, stop = self.pending_ranges()
+        if not ranges:
+            return False
+        added = False
+        for key, sampled_at, value in source.query_history(ranges, stop, self.window):
+            self.add(key, sampled_at, value)
+            added = True
+        return added
+
+
+HISTORY = SeriesHistory(HISTORY_SERIES)
+
+
+def _default_system_data() -> dict:
+    return {
         'download': 0,
         'upload': 0,
         'location': "Unknown",
@@ -215,44 +919,69 @@ def get_system_data():
         'input_voltage': 0,
         'output_voltage': 0,
         'internal_temp': 0,
-        'smallserver_cpu_temp': None,
-        'bigserver_cpu_temp': None,
-        'smallserver_ram_used_percent': None,
-        'bigserver_ram_used_percent': None,
+        **{f"cpu_temp:{alias}": None for _, alias in SERVERS},
+        **{f"ram_used_percent:{alias}": None for _, alias in SERVERS},
         'nvme_0100_temp': None,
         'nvme_8100_temp': None,
     }
-    
-    try:
-        # Get internet metrics
-        tables = client.query_api().query(internet_query)
-        for table in tables:
-            for record in table.records:
-                field = record.get_field()
-                if field in data:
-                    data[field] = record.get_value()
-
-        # Get UPS metrics
-        tables = client.query_api().query(ups_query)
-        for table in tables:
-            for record in table.records:
-                field = record.get_field()
-                if field in data:
-                    data[field] = record.get_value()
-
-        # Server metrics (two columns)
-        data['smallserver_cpu_temp'] = _query_last_value(_server_cpu_temp_query(SMALLSERVER_ALIAS))
-        data['bigserver_cpu_temp'] = _query_last_value(_server_cpu_temp_query(BIGSERVER_ALIAS))
-        data['smallserver_ram_used_percent'] = _query_last_value(_server_ram_used_query(SMALLSERVER_ALIAS))
-        data['bigserver_ram_used_percent'] = _query_last_value(_server_ram_used_query(BIGSERVER_ALIAS))
-
-        # NVME temps (typically on BIGSERVER, configurable)
-        data['nvme_0100_temp'] = _query_last_value(_server_nvme_temp_query(NVME_SERVER_ALIAS, NVME_0100_CHIP))
-        data['nvme_8100_temp'] = _query_last_value(_server_nvme_temp_query(NVME_SERVER_ALIAS, NVME_8100_CHIP))
-
-        return data
-    finally:
-        client.close()
+
+
+def _get_system_data_concurrent(source: MetricsSource, series_list) -> bool:
+    global _FETCH_POOL
+    if _FETCH_POOL is None:
+        _FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="screen_fetch")
+
+    sections = {}
+    for series in series_list:
+        sections.setdefault(series.section, []).append(series)
+
+    # Submit every section query at once: the refresh takes as long as the slowest query (bounded by its deadline)
+    submitted_at = time.monotonic()
+    futures = {
+        section: _FETCH_POOL.submit(source.query_latest, series_list)
+        for section, series_list in sections.items()
+    }
+
+    # Returns False only if every section failed: one slow section keeps its last-known values without making the
+    # circuit breaker skip the other sections
+    any_ok = False
+    for section, future in futures.items():
+        deadline = submitted_at + FETCH_DEADLINES.get(section, FETCH_DEADLINE)
+        try:
+            METRIC_STORE.update(*future.result(timeout=max(0.0, deadline - time.monotonic())))
+            any_ok = True
+        except Exception as e:
+            logger.warning(f"Query for section '{section}' failed or timed out ({e!r}), keeping last-known values")
+    return any_ok
+
+
+def get_system_data(source: MetricsSource, sections=None):
+    # Values of the given sections (all of them by default): freshly fetched when possible, last-known otherwise.
+    # Never raises: while the metrics source is failing, queries are skipped until the circuit breaker lets one through.
+    series_list = [series for series in SCREEN_SERIES if sections is None or series.section in sections]
+
+    if series_list and SOURCE_BREAKER.allow():
+        try:
+            if FETCH_MODE == "concurrent":
+                ok = _get_system_data_concurrent(source, series_list)
+            else:
+                # All due sections in a single round trip
+                METRIC_STORE.update(*source.query_latest(series_list))
+                ok = True
+        except Exception as e:
+            logger.error(f"{source.name} query failed: {e}")
+            ok = False
+        if ok:
+            SOURCE_BREAKER.success()
+        else:
+            SOURCE_BREAKER.failure()
+
+    # Initialize values, then fill in the last-known-good ones
+    defaults = _default_system_data()
+    data = {key: defaults[key] for series in series_list for key in series_keys(series)}
+    data.update(METRIC_STORE.last_known(data))
+    return data
+
 
 def temp_to_color(temp_value):
     if temp_value is None:
@@ -291,49 +1020,428 @@ def _capitalize_only_first(value):
         return "Unknown"
     return value[:1].upper() + value[1:].lower()
 
-def main():
-    # Initialize display communication
-    lcd_comm = LcdCommRevA(
-        com_port="/dev/ttyACM0",
-        display_width=320,
-        display_height=480
-    )
 
-    # Initialize the display
-    lcd_comm.Reset()
-    lcd_comm.InitializeComm()
+class DeadlineScheduler:
+    """Runs named jobs at fixed intervals, using a heap of deadlines on the monotonic clock.
+
+    Deadlines advance by whole intervals from the previous deadline (not from when the job actually ran),
+    so timing doesn't drift; ticks missed while busy are skipped instead of run in a burst.
+    """
+
+    def __init__(self, intervals: dict, start: float = None):
+        start = time.monotonic() if start is None else start
+        # Jobs with an interval of 0 are disabled
+        self.intervals = {name: interval for name, interval in intervals.items() if interval > 0}
+        self._heap = [(start, name) for name in self.intervals]
+        heapq.heapify(self._heap)
+
+    def time_until_next(self) -> float:
+        if not self._heap:
+            return math.inf
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def pop_due(self, now: float = None) -> list:
+        # Return the names of the jobs that are due, and schedule their next run
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, name = heapq.heappop(self._heap)
+            due.append(name)
+            interval = self.intervals[name]
+            deadline += interval
+            if deadline <= now:
+                deadline += ((now - deadline) // interval + 1) * interval
+            heapq.heappush(self._heap, (deadline, name))
+        return due
+
+
+class MetricSnapshot:
+    """Latest fetched metrics, written by the prefetch thread and read by the render loop."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.data = _default_system_data()
+        # Wall-clock time of the last update, and per-section counters that change on every update of that section
+        self.timestamp = 0.0
+        self.versions = {}
+
+    def update(self, values: dict, sections):
+        with self._condition:
+            self.data = {**self.data, **values}
+            self.timestamp = time.time()
+            for section in sections:
+                self.versions[section] = self.versions.get(section, 0) + 1
+            self._condition.notify_all()
+
+    def get(self):
+        with self._condition:
+            return dict(self.versions), self.timestamp, self.data
+
+    def wait_for_update(self, versions: dict, timeout: float):
+        # Block until a section is updated after `versions` was read, or until the timeout expires
+        with self._condition:
+            self._condition.wait_for(lambda: self.versions != versions,
+                                     timeout=None if math.isinf(timeout) else timeout)
+
+
+def fetch_screen_data(source: MetricsSource, sections=None) -> dict:
+    data = get_system_data(source, sections)
+
+    # WAN/IP-derived ISP/location, preferred over the Influx values when drawing
+    if sections is None or "wan" in sections:
+        ip_details = get_ip_details()
+        data["wan_location"] = ip_details.get("location_city")
+        data["wan_isp"] = ip_details.get("isp")
+
+    # Sparkline history: only windows completed since the last fetch are queried
+    if (sections is None or "history" in sections) and SOURCE_BREAKER.allow():
+        try:
+            HISTORY.fetch(source)
+        except Exception as e:
+            logger.warning(f"History query failed, keeping the current sparklines: {e}")
+    return data
+
+
+def prefetch_loop(source: MetricsSource, snapshot: MetricSnapshot, poll_influx: bool = True):
+    influx_sections = [section for section in FETCH_SECTIONS if section not in ("wan", "history")]
+    if not poll_influx:
+        # Values are pushed to us: query InfluxDB once so the screen doesn't start empty.
+        # The sparkline history is still fetched from InfluxDB (one small query per window).
+        snapshot.update(fetch_screen_data(source, influx_sections), influx_sections)
+
+    scheduler = DeadlineScheduler({
+        section: REFRESH_INTERVALS.get(section, FETCH_INTERVAL)
+        for section in FETCH_SECTIONS if poll_influx or section not in influx_sections
+    })
+    if not scheduler.intervals:
+        return
+    while True:
+        time.sleep(scheduler.time_until_next())
+        # Sections that are due at the same time are fetched together
+        sections = scheduler.pop_due()
+        try:
+            snapshot.update(fetch_screen_data(source, sections), sections)
+        except Exception as e:
+            logger.error(f"Failed to fetch screen data ({', '.join(sections)}): {e}")
+
+
+def _split_line_protocol(text: str, separator: str) -> list:
+    # Split on `separator`, except when escaped with a backslash or inside a double-quoted string field value
+    parts, current, quoted, index = [], [], False, 0
+    while index < len(text):
+        char = text[index]
+        if char == "\\" and index + 1 < len(text):
+            current.append(text[index:index + 2])
+            index += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        if char == separator and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        index += 1
+    parts.append("".join(current))
+    return parts
+
+
+def _unescape(text: str) -> str:
+    return re.sub(r"\\(.)", r"\1", text)
+
+
+def _line_protocol_value(value: str):
+    if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    if value[-1:] in ("i", "u"):
+        return int(value[:-1])
+    if value in ("t", "T", "true", "True", "TRUE"):
+        return True
+    if value in ("f", "F", "false", "False", "FALSE"):
+        return False
+    return float(value)
+
+
+def parse_line_protocol(line: str):
+    """Parse one line of InfluxDB line protocol into (measurement, tags, fields, timestamp or None).
+
+    Raises ValueError on malformed lines.
+    """
+    parts = [part for part in _split_line_protocol(line.strip(), " ") if part]
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Malformed line protocol: {line!r}")
+
+    series = _split_line_protocol(parts[0], ",")
+    measurement = _unescape(series[0])
+    tags = {}
+    for item in series[1:]:
+        key, _, value = item.partition("=")
+        tags[_unescape(key)] = _unescape(value)
+
+    fields = {}
+    for item in _split_line_protocol(parts[1], ","):
+        key, separator, value = item.partition("=")
+        if not separator or not value:
+            raise ValueError(f"Malformed field {item!r} in line protocol: {line!r}")
+        fields[_unescape(key)] = _line_protocol_value(value)
+
+    timestamp = int(parts[2]) if len(parts) == 3 else None
+    return measurement, tags, fields, timestamp
+
+
+# Line protocol timestamp precision, in seconds
+PRECISIONS = {"ns": 1e-9, "n": 1e-9, "us": 1e-6, "u": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+
+
+class PushListener:
+    """Receives line protocol pushed by Telegraf and keeps the screen snapshot up to date as points arrive.
+
+    Only points matching a displayed series are kept; everything else is dropped.
+    """
+
+    def __init__(self, snapshot: MetricSnapshot, host: str = PUSH_LISTEN_HOST, udp_port: int = PUSH_UDP_PORT,
+                 http_port: int = PUSH_HTTP_PORT):
+        self.snapshot = snapshot
+        self.servers = []
+        if udp_port:
+            self.servers.append(socketserver.ThreadingUDPServer((host, udp_port), _PushUdpHandler))
+        if http_port:
+            self.servers.append(ThreadingHTTPServer((host, http_port), _PushHttpHandler))
+        for server in self.servers:
+            server.listener = self
+
+    def start(self):
+        for server in self.servers:
+            logger.info(f"Listening for line protocol on {server.server_address}")
+            threading.Thread(target=server.serve_forever, name="screen_push", daemon=True).start()
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def ingest(self, payload: str, precision: str = "ns") -> int:
+        # Returns the number of screen values updated. As with InfluxDB, valid lines are kept even if others are
+        # malformed, then ValueError is raised for the rejected ones (or for an unknown precision, with nothing kept)
+        if precision not in PRECISIONS:
+            raise ValueError(f"Invalid precision {precision!r}")
+        values, sample_times, sections = {}, {}, set()
+        known_times = METRIC_STORE.get_sample_times()
+        # Values whose source appeared in the payload (same measurement and tags, e.g. the same server)
+        confirmed = set()
+        rejected = []
+        for line in payload.splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            try:
+                measurement, tags, fields, timestamp = parse_line_protocol(line)
+            except ValueError as e:
+                rejected.append(str(e))
+                continue
+            sampled_at = timestamp * PRECISIONS[precision] if timestamp is not None else time.time()
+
+            for series in SCREEN_SERIES:
+                # Series without a measurement (speedtests) are only confirmed by their own values
+                row = {**tags, "_measurement": measurement, "_field": series.field}
+                if series.measurement is not None and _series_matches(series, row):
+                    confirmed.add(_series_key(series, row))
+
+            for field, value in fields.items():
+                row = {**tags, "_measurement": measurement, "_field": field}
+                for series in SCREEN_SERIES:
+                    if not _series_matches(series, row):
+                        continue
+                    key = _series_key(series, row)
+                    # Ignore points older than the value already shown
+                    if sampled_at >= max(known_times.get(key, 0), sample_times.get(key, 0)):
+                        values[key] = value
+                        sample_times[key] = sampled_at
+                        sections.add(series.section)
+
+        if values:
+            METRIC_STORE.update(values, sample_times)
+            self.snapshot.update(values, sections)
+        # Their source is still pushing: values it sends less often than others are not stale
+        METRIC_STORE.confirm(confirmed)
+        if rejected:
+            raise ValueError(f"Partial write: {len(rejected)} line(s) rejected, first error: {rejected[0]}")
+        return len(values)
+
+
+class _PushUdpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        payload, _ = self.request
+        try:
+            self.server.listener.ingest(payload.decode("utf-8", "replace"))
+        except ValueError as e:
+            # No reply over UDP
+            logger.debug(str(e))
+
+
+class _PushHttpHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        return
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "application/json"):
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path in ("/ping", "/health"):
+            self._reply(204)
+        elif path == "/query":
+            # Telegraf's InfluxDB v1 output creates its database at startup: pretend it worked
+            self._reply(200, b'{"results":[{"statement_id":0}]}')
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/query":
+            self._reply(200, b'{"results":[{"statement_id":0}]}')
+            return
+        if url.path not in ("/write", "/api/v2/write"):
+            self._reply(404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._reply(400, b'{"error":"invalid Content-Length"}')
+            return
+        if length > PUSH_MAX_BODY:
+            self._reply(413, b'{"error":"request too large"}')
+            return
+
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Encoding", "") == "gzip":
+            # Decompress at most PUSH_MAX_BODY bytes, so a small request can't expand into a huge one
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(body, PUSH_MAX_BODY)
+            except zlib.error:
+                self._reply(400, b'{"error":"invalid gzip body"}')
+                return
+            if decompressor.unconsumed_tail:
+                self._reply(413, b'{"error":"request too large"}')
+                return
+            if not decompressor.eof:
+                self._reply(400, b'{"error":"truncated gzip body"}')
+                return
+        precision = parse_qs(url.query).get("precision", ["ns"])[0]
+        try:
+            self.server.listener.ingest(body.decode("utf-8", "replace"), precision)
+        except ValueError as e:
+            logger.debug(f"Rejected line protocol write: {e}")
+            self._reply(400, json.dumps({"code": "invalid", "message": str(e)}).encode("utf-8"))
+            return
+        self._reply(204)
+
+
+def stale_keys(confirmed_times: dict, now: float = None) -> set:
+    now = time.time() if now is None else now
+    return {key for key, confirmed_at in confirmed_times.items() if now - confirmed_at > STALE_AFTER}
+
+
+class CellCache:
+    """Draws dynamic cells through `lcd_comm`, skipping cells whose content did not change since the last draw.
+
+    Exposes the same `DisplayText` call as LcdComm, so the draw functions can use either one.
+    """
+
+    def __init__(self, lcd_comm):
+        self.lcd_comm = lcd_comm
+        self.cells = {}  # { key=(x, y, width, height), value=(text, font_color, other render parameters) }
+        # Counters for the current frame, reset by begin_frame()
+        self.sent = 0
+        self.skipped = 0
+
+    def begin_frame(self):
+        self.sent = 0
+        self.skipped = 0
+
+    def invalidate(self):
+        # Forget everything, e.g. after the screen has been cleared
+        self.cells.clear()
+
+    def DisplayText(self, text: str, x: int = 0, y: int = 0, width: int = 0, height: int = 0, **kwargs):
+        box = (x, y, width, height)
+        content = (text, kwargs.get("font_color"), tuple(sorted(kwargs.items())))
+        if self.cells.get(box) == content:
+            self.skipped += 1
+            return
+        self.lcd_comm.DisplayText(text=text, x=x, y=y, width=width, height=height, **kwargs)
+        self.cells[box] = content
+        self.sent += 1
+
+    def DisplayLineGraph(self, x: int, y: int, width: int, height: int, values, **kwargs):
+        box = (x, y, width, height)
+        content = (tuple(values), tuple(sorted(kwargs.items())))
+        if self.cells.get(box) == content:
+            self.skipped += 1
+            return
+        self.lcd_comm.DisplayLineGraph(x=x, y=y, width=width, height=height, values=values, **kwargs)
+        self.cells[box] = content
+        self.sent += 1
+
+
+class FrameCanvas(LcdComm):
+    """Off-screen display: everything drawn through it is pasted into `image` instead of being sent to the LCD,
+    so a layer can be rendered once and sent later as a single full-screen bitmap."""
+
+    def __init__(self, display_width: int = 320, display_height: int = 480, background=(0, 0, 0),
+                 background_image: str = None):
+        LcdComm.__init__(self, display_width=display_width, display_height=display_height)
+        # `image` already holds everything drawn: no shadow framebuffer needed
+        self.framebuffer_enabled = False
+        self.image = Image.new("RGB", (self.get_width(), self.get_height()), background)
+        if background_image is not None and os.path.exists(background_image):
+            self.image.paste(self.open_image(background_image).convert("RGB"), (0, 0))
+
+    @staticmethod
+    def auto_detect_com_port():
+        return None
 
-    # Configure display settings
-    lcd_comm.SetBrightness(level=10)
-    lcd_comm.SetOrientation(orientation=Orientation.PORTRAIT)
+    def InitializeComm(self):
+        pass
 
-    # Draw black background once (avoid full-screen wipe on every refresh)
-    if not os.path.exists("black_bg.png"):
-        Image.new("RGB", (320, 480), color=(0, 0, 0)).save("black_bg.png")
-    lcd_comm.DisplayBitmap("black_bg.png")
+    def Reset(self):
+        pass
 
-    # Fixed regions for dynamic values (prevents leftover characters without full clears)
-    FULL_LINE_W = 315
-    FULL_LINE_H = ROW_H
-    CELL_W = 70
-    SMALL_CELL_X = SMALL_RIGHT_X - CELL_W
-    BIG_CELL_X = BIG_RIGHT_X - CELL_W
+    def Clear(self):
+        pass
 
-    # Layout Y positions (constant)
-    internet_y = INTERNET_Y
-    internet_last_line_y = internet_y + HEADER_TO_FIRST_ROW_GAP + 3 * ROW_GAP
+    def ScreenOff(self):
+        pass
 
-    ups_y = internet_last_line_y + SECTION_TO_SECTION_GAP
-    ups_rows = 4
-    servers_y = (ups_y + HEADER_TO_FIRST_ROW_GAP + (ups_rows - 1) * ROW_GAP) + SECTION_TO_SECTION_GAP
+    def ScreenOn(self):
+        pass
 
-    row1_y = servers_y + HEADER_TO_FIRST_ROW_GAP
-    row2_y = row1_y + ROW_GAP
+    def SetBrightness(self, level: int = 25):
+        pass
 
-    nvme_y = row2_y + SECTION_TO_SECTION_GAP
-    nvme_line_y = nvme_y + HEADER_TO_FIRST_ROW_GAP
+    def SetOrientation(self, orientation: Orientation = Orientation.PORTRAIT):
+        self.orientation = orientation
 
-    # Static labels/headers (draw once)
+    def SendPILImage(self, image: Image, x: int = 0, y: int = 0, image_width: int = 0, image_height: int = 0):
+        self.image.paste(image, (x, y))
+
+
+def render_static_frame(draw_static, background_image: str = BACKGROUND_IMAGE) -> Image:
+    # Background + static layer of a page, composed off-screen into one full-screen image
+    canvas = FrameCanvas(background_image=background_image)
+    draw_static(canvas)
+    return canvas.image
+
+
+def _draw_separator(lcd_comm):
     lcd_comm.DisplayText(
         text="____________________________________",
         x=5,
@@ -344,10 +1452,15 @@ def main():
         background_color=(0, 0, 0),
     )
 
+
+def draw_static_layout(lcd_comm):
+    # Static labels/headers (draw once)
+    _draw_separator(lcd_comm)
+
     lcd_comm.DisplayText(
         text="INTERNET",
         x=5,
-        y=internet_y,
+        y=INTERNET_Y,
         font="roboto/Roboto-Bold.ttf",
         font_size=24,
         font_color=LIGHT_BLUE,
@@ -357,7 +1470,7 @@ def main():
     lcd_comm.DisplayText(
         text="UPS",
         x=5,
-        y=ups_y,
+        y=UPS_Y,
         font="roboto/Roboto-Bold.ttf",
         font_size=24,
         font_color=LIGHT_GREEN,
@@ -367,7 +1480,7 @@ def main():
     lcd_comm.DisplayText(
         text="SERVERS",
         x=LABEL_COL_X,
-        y=servers_y,
+        y=SERVERS_Y,
         font="roboto/Roboto-Bold.ttf",
         font_size=SECTION_FONT_SIZE,
         font_color=LIGHT_BLUE,
@@ -375,42 +1488,20 @@ def main():
         align="left",
         anchor="lt",
     )
-    lcd_comm.DisplayText(
-        text="SMALL",
-        x=SMALL_RIGHT_X,
-        y=servers_y,
-        font="roboto/Roboto-Bold.ttf",
-        font_size=SECTION_FONT_SIZE,
-        font_color=WHITE,
-        background_color=(0, 0, 0),
-        align="right",
-        anchor="rt",
-    )
     lcd_comm.DisplayText(
         text="|",
         x=DIVIDER_X,
-        y=servers_y,
-        font="roboto/Roboto-Bold.ttf",
-        font_size=SECTION_FONT_SIZE,
-        font_color=WHITE,
-        background_color=(0, 0, 0),
-    )
-    lcd_comm.DisplayText(
-        text="BIG",
-        x=BIG_RIGHT_X,
-        y=servers_y,
+        y=SERVERS_Y,
         font="roboto/Roboto-Bold.ttf",
         font_size=SECTION_FONT_SIZE,
         font_color=WHITE,
         background_color=(0, 0, 0),
-        align="right",
-        anchor="rt",
     )
 
     lcd_comm.DisplayText(
         text="CPU Temp",
         x=LABEL_COL_X,
-        y=row1_y,
+        y=ROW1_Y,
         font=FONT_TABLE,
         font_size=TABLE_FONT_SIZE,
         font_color=WHITE,
@@ -421,7 +1512,7 @@ def main():
     lcd_comm.DisplayText(
         text="|",
         x=DIVIDER_X,
-        y=row1_y,
+        y=ROW1_Y,
         font=FONT_TABLE,
         font_size=TABLE_FONT_SIZE,
         font_color=WHITE,
@@ -431,7 +1522,7 @@ def main():
     lcd_comm.DisplayText(
         text="RAM Usage",
         x=LABEL_COL_X,
-        y=row2_y,
+        y=ROW2_Y,
         font=FONT_TABLE,
         font_size=TABLE_FONT_SIZE,
         font_color=WHITE,
@@ -442,7 +1533,7 @@ def main():
     lcd_comm.DisplayText(
         text="|",
         x=DIVIDER_X,
-        y=row2_y,
+        y=ROW2_Y,
         font=FONT_TABLE,
         font_size=TABLE_FONT_SIZE,
         font_color=WHITE,
@@ -452,202 +1543,441 @@ def main():
     lcd_comm.DisplayText(
         text="NVME",
         x=5,
-        y=nvme_y,
+        y=NVME_Y,
         font="roboto/Roboto-Bold.ttf",
         font_size=SECTION_FONT_SIZE,
         font_color=LIGHT_YELLOW,
         background_color=(0, 0, 0),
     )
 
-    while True:
-        # Get latest data
-        data = get_system_data()
 
-        # Prefer WAN/IP-derived ISP/location (fallback to last successful values)
-        ip_details = get_ip_details()
-        if ip_details.get("location_city") and ip_details["location_city"] != "Unknown":
-            data["location"] = ip_details["location_city"]
-        if ip_details.get("isp") and ip_details["isp"] != "Unknown":
-            data["isp"] = ip_details["isp"]
-
-        # Display time and date
-        current_time = time.strftime("%H:%M:%S")
-        current_date = time.strftime("%d/%m/%Y")
-        lcd_comm.DisplayText(
-            text=current_time,
-            x=5,
-            y=5,
-            width=155,
-            height=34,
-            font="roboto/Roboto-Bold.ttf",
-            font_size=24,
-            font_color=WHITE,
-            background_color=(0, 0, 0),
-            align="left",
-            anchor="lt",
-        )
+def _draw_detail_static(lcd_comm, title: str, title_color, labels):
+    # Static layer of a detail page: title, then the label of each row
+    _draw_separator(lcd_comm)
+    lcd_comm.DisplayText(
+        text=title,
+        x=LABEL_COL_X,
+        y=INTERNET_Y,
+        font="roboto/Roboto-Bold.ttf",
+        font_size=SECTION_FONT_SIZE,
+        font_color=title_color,
+        background_color=(0, 0, 0),
+    )
+    for index, label in enumerate(labels[:DETAIL_ROWS]):
         lcd_comm.DisplayText(
-            text=current_date,
-            x=190,
-            y=5,
-            width=125,
-            height=34,
-            font="roboto/Roboto-Bold.ttf",
-            font_size=24,
+            text=label,
+            x=LABEL_COL_X,
+            y=DETAIL_Y + index * DETAIL_BLOCK_H,
+            font=FONT_TABLE_BOLD,
+            font_size=TABLE_FONT_SIZE,
             font_color=WHITE,
             background_color=(0, 0, 0),
-            align="right",
-            anchor="rt",
         )
 
-        lcd_comm.DisplayText(
-            text=f"Location: {data['location']}",
-            x=5,
-            y=internet_y + HEADER_TO_FIRST_ROW_GAP,
-            width=FULL_LINE_W,
-            height=FULL_LINE_H,
-            font="roboto/Roboto-Regular.ttf",
-            font_size=20,
-            font_color=WHITE,
-            background_color=(0, 0, 0),
-            align="left",
-            anchor="lt",
-        )
 
-        lcd_comm.DisplayText(
-            text=f"ISP: {_capitalize_only_first(data['isp'])}",
-            x=5,
-            y=internet_y + HEADER_TO_FIRST_ROW_GAP + ROW_GAP,
-            width=FULL_LINE_W,
-            height=FULL_LINE_H,
-            font="roboto/Roboto-Regular.ttf",
-            font_size=20,
-            font_color=WHITE,
-            background_color=(0, 0, 0),
-            align="left",
-            anchor="lt",
-        )
+def draw_servers_page_static(lcd_comm):
+    _draw_detail_static(lcd_comm, "SERVERS", LIGHT_BLUE, [label for label, _ in SERVERS])
+
+
+def draw_storage_page_static(lcd_comm):
+    _draw_detail_static(lcd_comm, "STORAGE", LIGHT_YELLOW, [label for label, _ in NVME_DRIVES])
 
-        lcd_comm.DisplayText(
-            text=f"Latency: {data['latency']:.0f}ms",
-            x=5,
-            y=internet_y + HEADER_TO_FIRST_ROW_GAP + 2 * ROW_GAP,
-            width=FULL_LINE_W,
-            height=FULL_LINE_H,
-            font="roboto/Roboto-Regular.ttf",
-            font_size=20,
-            font_color=WHITE,
-            background_color=(0, 0, 0),
-            align="left",
-            anchor="lt",
-        )
 
-        internet_metrics = f"Up: {data['upload']:.1f}  |  Down:{data['download']:.1f}"
+def draw_clock(lcd_comm):
+    # Display time and date
+    current_time = time.strftime("%H:%M:%S")
+    current_date = time.strftime("%d/%m/%Y")
+    lcd_comm.DisplayText(
+        text=current_time,
+        x=5,
+        y=5,
+        width=155,
+        height=34,
+        font="roboto/Roboto-Bold.ttf",
+        font_size=24,
+        font_color=WHITE,
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+    lcd_comm.DisplayText(
+        text=current_date,
+        x=190,
+        y=5,
+        width=125,
+        height=34,
+        font="roboto/Roboto-Bold.ttf",
+        font_size=24,
+        font_color=WHITE,
+        background_color=(0, 0, 0),
+        align="right",
+        anchor="rt",
+    )
+
+
+def _wan_or_influx(data: dict, wan_key: str, key: str):
+    # Prefer WAN/IP-derived ISP/location (fallback to the Influx value)
+    value = data.get(wan_key)
+    if value and value != "Unknown":
+        return value
+    return data[key]
+
+
+def _uses_influx(data: dict, wan_key: str, key: str) -> list:
+    # Influx key a WAN-or-Influx line depends on, for staleness
+    return [] if _wan_or_influx(data, wan_key, key) == data.get(wan_key) else [key]
+
+
+def _cell_color(color, keys, stale):
+    # Values not confirmed by a fetch for STALE_AFTER seconds are drawn dimmed
+    if any(key in stale for key in keys):
+        return tuple(channel // 2 for channel in color)
+    return color
+
+
+def draw_sparkline(lcd_comm, key: str, y: int, color, stale=frozenset(), x: int = SPARKLINE_X,
+                   width: int = SPARKLINE_W, height: int = SPARKLINE_H):
+    # History of `key` (next to a section header by default), scaled to its own min/max
+    values = HISTORY.values(key)
+    if len(values) < 2:
+        return
+    low, high = min(values), max(values)
+    margin = max(high - low, 1) * 0.1
+    lcd_comm.DisplayLineGraph(
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+        values=values,
+        min_value=low - margin,
+        max_value=high + margin,
+        line_color=_cell_color(color, [key], stale),
+        line_width=1,
+        graph_axis=False,
+        background_color=(0, 0, 0),
+    )
+
+
+def draw_internet(lcd_comm, data, stale=frozenset()):
+    draw_sparkline(lcd_comm, "latency", INTERNET_Y + 2, LIGHT_BLUE, stale)
+
+    lcd_comm.DisplayText(
+        text=f"Location: {_wan_or_influx(data, 'wan_location', 'location')}",
+        x=5,
+        y=INTERNET_Y + HEADER_TO_FIRST_ROW_GAP,
+        width=FULL_LINE_W,
+        height=FULL_LINE_H,
+        font="roboto/Roboto-Regular.ttf",
+        font_size=20,
+        font_color=_cell_color(WHITE, _uses_influx(data, 'wan_location', 'location'), stale),
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+
+    lcd_comm.DisplayText(
+        text=f"ISP: {_capitalize_only_first(_wan_or_influx(data, 'wan_isp', 'isp'))}",
+        x=5,
+        y=INTERNET_Y + HEADER_TO_FIRST_ROW_GAP + ROW_GAP,
+        width=FULL_LINE_W,
+        height=FULL_LINE_H,
+        font="roboto/Roboto-Regular.ttf",
+        font_size=20,
+        font_color=_cell_color(WHITE, _uses_influx(data, 'wan_isp', 'isp'), stale),
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+
+    lcd_comm.DisplayText(
+        text=f"Latency: {data['latency']:.0f}ms",
+        x=5,
+        y=INTERNET_Y + HEADER_TO_FIRST_ROW_GAP + 2 * ROW_GAP,
+        width=FULL_LINE_W,
+        height=FULL_LINE_H,
+        font="roboto/Roboto-Regular.ttf",
+        font_size=20,
+        font_color=_cell_color(WHITE, ["latency"], stale),
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+
+    internet_metrics = f"Up: {data['upload']:.1f}  |  Down:{data['download']:.1f}"
+    lcd_comm.DisplayText(
+        text=internet_metrics,
+        x=5,
+        y=INTERNET_LAST_LINE_Y,
+        width=FULL_LINE_W,
+        height=FULL_LINE_H,
+        font="roboto/Roboto-Regular.ttf",
+        font_size=20,
+        font_color=_cell_color(WHITE, ["upload", "download"], stale),
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+
+
+def draw_ups(lcd_comm, data, stale=frozenset()):
+    draw_sparkline(lcd_comm, "load_percent", UPS_Y + 2, LIGHT_GREEN, stale)
+
+    y_pos = UPS_Y + HEADER_TO_FIRST_ROW_GAP
+    ups_info = [
+        (f"Status: {data['ups_status']}  |  Charger: {data['battery_charger_status']}",
+         ["ups_status", "battery_charger_status"]),
+        (f"Battery: {data['battery_charge_percent']:.1f}%  |  {data['battery_voltage']:.1f}V",
+         ["battery_charge_percent", "battery_voltage"]),
+        (f"Load: {data['load_percent']:.1f}%  |  Temp: {data['internal_temp']:.1f}°C",
+         ["load_percent", "internal_temp"]),
+        (f"Input: {data['input_voltage']:.1f}V  |  Output: {data['output_voltage']:.1f}V",
+         ["input_voltage", "output_voltage"]),
+    ]
+    for info, keys in ups_info:
         lcd_comm.DisplayText(
-            text=internet_metrics,
+            text=info,
             x=5,
-            y=internet_last_line_y,
+            y=y_pos,
             width=FULL_LINE_W,
             height=FULL_LINE_H,
             font="roboto/Roboto-Regular.ttf",
             font_size=20,
-            font_color=WHITE,
+            font_color=_cell_color(WHITE, keys, stale),
             background_color=(0, 0, 0),
             align="left",
             anchor="lt",
         )
+        y_pos += ROW_GAP
 
-        y_pos = ups_y + HEADER_TO_FIRST_ROW_GAP
-        ups_info = [
-            f"Status: {data['ups_status']}  |  Charger: {data['battery_charger_status']}",
-            f"Battery: {data['battery_charge_percent']:.1f}%  |  {data['battery_voltage']:.1f}V",
-            f"Load: {data['load_percent']:.1f}%  |  Temp: {data['internal_temp']:.1f}°C",
-            f"Input: {data['input_voltage']:.1f}V  |  Output: {data['output_voltage']:.1f}V",
-        ]
-        for info in ups_info:
-            lcd_comm.DisplayText(
-                text=info,
-                x=5,
-                y=y_pos,
-                width=FULL_LINE_W,
-                height=FULL_LINE_H,
-                font="roboto/Roboto-Regular.ttf",
-                font_size=20,
-                font_color=WHITE,
-                background_color=(0, 0, 0),
-                align="left",
-                anchor="lt",
-            )
-            y_pos += ROW_GAP
+
+def servers_page() -> list:
+    # Servers shown right now: two per page, pages rotate every SERVERS_PAGE_INTERVAL seconds
+    pages = max(1, math.ceil(len(SERVERS) / len(SERVER_COLUMNS)))
+    page = int(time.monotonic() // SERVERS_PAGE_INTERVAL) % pages if SERVERS_PAGE_INTERVAL > 0 else 0
+    return SERVERS[page * len(SERVER_COLUMNS):(page + 1) * len(SERVER_COLUMNS)]
+
+
+def draw_servers(lcd_comm, data, stale=frozenset()):
+    shown = servers_page()
+    for index, (right_x, header_w, cell_x) in enumerate(SERVER_COLUMNS):
+        # Blank column when the last page has fewer servers
+        label, alias = shown[index] if index < len(shown) else (" ", None)
+        cpu_key, ram_key = f"cpu_temp:{alias}", f"ram_used_percent:{alias}"
 
         lcd_comm.DisplayText(
-            text=_format_temp(data.get("smallserver_cpu_temp")),
-            x=SMALL_CELL_X,
-            y=row1_y,
-            width=CELL_W,
-            height=ROW_H,
-            font=FONT_TABLE,
-            font_size=TABLE_FONT_SIZE,
-            font_color=temp_to_color(data.get("smallserver_cpu_temp")),
-            background_color=(0, 0, 0),
-            align="right",
-            anchor="rt",
-        )
-        lcd_comm.DisplayText(
-            text=_format_temp(data.get("bigserver_cpu_temp")),
-            x=BIG_CELL_X,
-            y=row1_y,
-            width=CELL_W,
-            height=ROW_H,
-            font=FONT_TABLE,
-            font_size=TABLE_FONT_SIZE,
-            font_color=temp_to_color(data.get("bigserver_cpu_temp")),
+            text=label,
+            x=right_x - header_w,
+            y=SERVERS_Y,
+            width=header_w,
+            height=34,
+            font="roboto/Roboto-Bold.ttf",
+            font_size=SECTION_FONT_SIZE,
+            font_color=WHITE,
             background_color=(0, 0, 0),
             align="right",
             anchor="rt",
         )
-
         lcd_comm.DisplayText(
-            text=_format_percent(data.get("smallserver_ram_used_percent")),
-            x=SMALL_CELL_X,
-            y=row2_y,
+            text=_format_temp(data.get(cpu_key)) if alias else " ",
+            x=cell_x,
+            y=ROW1_Y,
             width=CELL_W,
             height=ROW_H,
             font=FONT_TABLE,
             font_size=TABLE_FONT_SIZE,
-            font_color=WHITE,
+            font_color=_cell_color(temp_to_color(data.get(cpu_key)), [cpu_key], stale),
             background_color=(0, 0, 0),
             align="right",
             anchor="rt",
         )
         lcd_comm.DisplayText(
-            text=_format_percent(data.get("bigserver_ram_used_percent")),
-            x=BIG_CELL_X,
-            y=row2_y,
+            text=_format_percent(data.get(ram_key)) if alias else " ",
+            x=cell_x,
+            y=ROW2_Y,
             width=CELL_W,
             height=ROW_H,
             font=FONT_TABLE,
             font_size=TABLE_FONT_SIZE,
-            font_color=WHITE,
+            font_color=_cell_color(WHITE, [ram_key], stale),
             background_color=(0, 0, 0),
             align="right",
             anchor="rt",
         )
 
-        lcd_comm.DisplayText(
-            text=f"UMIS: {_format_temp(data.get('nvme_0100_temp'))}  |  990 Evo: {_format_temp(data.get('nvme_8100_temp'))}",
-            x=5,
-            y=nvme_line_y,
-            width=FULL_LINE_W,
-            height=FULL_LINE_H,
-            font="roboto/Roboto-Regular.ttf",
-            font_size=20,
-            font_color=WHITE,
-            background_color=(0, 0, 0),
-            align="left",
-            anchor="lt",
-        )
 
-        time.sleep(15)
+def draw_nvme(lcd_comm, data, stale=frozenset()):
+    lcd_comm.DisplayText(
+        text=f"UMIS: {_format_temp(data.get('nvme_0100_temp'))}  |  990 Evo: {_format_temp(data.get('nvme_8100_temp'))}",
+        x=5,
+        y=NVME_LINE_Y,
+        width=FULL_LINE_W,
+        height=FULL_LINE_H,
+        font="roboto/Roboto-Regular.ttf",
+        font_size=20,
+        font_color=_cell_color(WHITE, ["nvme_0100_temp", "nvme_8100_temp"], stale),
+        background_color=(0, 0, 0),
+        align="left",
+        anchor="lt",
+    )
+
+
+def _draw_detail_value(lcd_comm, text: str, x: int, y: int, color):
+    lcd_comm.DisplayText(
+        text=text,
+        x=x,
+        y=y,
+        width=DETAIL_VALUE_W,
+        height=ROW_H,
+        font=FONT_TABLE,
+        font_size=TABLE_FONT_SIZE,
+        font_color=color,
+        background_color=(0, 0, 0),
+        align="right",
+        anchor="rt",
+    )
+
+
+def draw_servers_detail(lcd_comm, data, stale=frozenset()):
+    # Servers page: CPU temperature and RAM usage of each server, with its CPU temperature history
+    for index, (_, alias) in enumerate(SERVERS[:DETAIL_ROWS]):
+        y = DETAIL_Y + index * DETAIL_BLOCK_H
+        cpu_key, ram_key = f"cpu_temp:{alias}", f"ram_used_percent:{alias}"
+        color = temp_to_color(data.get(cpu_key))
+        _draw_detail_value(lcd_comm, _format_temp(data.get(cpu_key)), DETAIL_CPU_X, y,
+                           _cell_color(color, [cpu_key], stale))
+        _draw_detail_value(lcd_comm, _format_percent(data.get(ram_key)), BIG_RIGHT_X - DETAIL_VALUE_W, y,
+                           _cell_color(WHITE, [ram_key], stale))
+        draw_sparkline(lcd_comm, cpu_key, y + ROW_H, color, stale, x=LABEL_COL_X, width=FULL_LINE_W,
+                       height=DETAIL_GRAPH_H)
+
+
+def draw_storage(lcd_comm, data, stale=frozenset()):
+    # Storage page: temperature of each NVME drive, with its history
+    for index, (_, key) in enumerate(NVME_DRIVES[:DETAIL_ROWS]):
+        y = DETAIL_Y + index * DETAIL_BLOCK_H
+        color = temp_to_color(data.get(key))
+        _draw_detail_value(lcd_comm, _format_temp(data.get(key)), BIG_RIGHT_X - DETAIL_VALUE_W, y,
+                           _cell_color(color, [key], stale))
+        draw_sparkline(lcd_comm, key, y + ROW_H, color, stale, x=LABEL_COL_X, width=FULL_LINE_W,
+                       height=DETAIL_GRAPH_H)
+
+
+# Dynamic sections: draw function, and the fetched sections it depends on (redrawn when any of them is updated)
+RENDER_SECTIONS = {
+    "internet": (draw_internet, ["internet", "wan", "history"]),
+    "ups": (draw_ups, ["ups", "history"]),
+    "servers": (draw_servers, ["servers"]),
+    "nvme": (draw_nvme, ["nvme"]),
+}
+
+# Pages: static layer (rendered once into a cached frame) and dynamic sections
+Page = namedtuple("Page", ["draw_static", "sections"])
+DASHBOARD_PAGES = {
+    "overview": Page(draw_static_layout, RENDER_SECTIONS),
+    "servers": Page(draw_servers_page_static, {"servers": (draw_servers_detail, ["servers", "history"])}),
+    "storage": Page(draw_storage_page_static, {"nvme": (draw_storage, ["nvme", "history"])}),
+}
+FETCH_SECTIONS = ["internet", "ups", "servers", "nvme", "wan", "history"]
+
+
+def main():
+    pages = [name for name in PAGES if name in DASHBOARD_PAGES]
+    for name in set(PAGES) - set(pages):
+        logger.warning(f"Unknown page '{name}' in PAGES (known pages: {', '.join(DASHBOARD_PAGES)})")
+    pages = pages or ["overview"]
+    page_index = 0
+    # Background + static layer (separator, headers, labels) of each page, composed off-screen once, before the
+    # display is even reset: the first frame is then a single full-screen transfer, and so is each page switch
+    frames = {name: render_static_frame(DASHBOARD_PAGES[name].draw_static) for name in pages}
+
+    # Initialize display communication
+    lcd_comm = LcdCommRevA(
+        com_port="/dev/ttyACM0",
+        display_width=320,
+        display_height=480
+    )
+
+    # Initialize the display
+    lcd_comm.Reset()
+    reset_done = time.perf_counter()
+    lcd_comm.InitializeComm()
+
+    # Configure display settings
+    lcd_comm.SetBrightness(level=10)
+    lcd_comm.SetOrientation(orientation=Orientation.PORTRAIT)
+    # Clock, temperatures and percentages are composed from pre-rasterized glyphs
+    lcd_comm.glyph_atlas_enabled = GLYPH_ATLAS
+    if ASSET_CACHE_DIR:
+        lcd_comm.asset_store = AssetStore(ASSET_CACHE_DIR)
+
+    lcd_comm.DisplayStaticBitmap(frames[pages[page_index]])
+    logger.info(f"First frame sent {(time.perf_counter() - reset_done) * 1000:.0f} ms after display reset")
+
+    _load_ip_details()
+
+    # Data acquisition runs on its own thread: the render loop below only reads the latest snapshot,
+    # so a slow Influx/WAN request never freezes the clock
+    snapshot = MetricSnapshot()
+    push = PUSH_UDP_PORT or PUSH_HTTP_PORT
+    if push:
+        PushListener(snapshot).start()
+    threading.Thread(target=prefetch_loop, args=(create_metrics_source(), snapshot, not push or PUSH_POLL_INFLUX),
+                     name="screen_prefetch", daemon=True).start()
+
+    # Dynamic cells are only redrawn when their text/colour changed
+    cells = CellCache(lcd_comm)
+
+    # The clock runs on its own deadline, aligned just after the start of the next second so it ticks on time
+    # SERVERS pages rotate on their own deadline too (only when there are more servers than columns), and so do
+    # dashboard pages (only when there are several)
+    clock = DeadlineScheduler({
+        "clock": REFRESH_INTERVALS["clock"],
+        "servers_page": SERVERS_PAGE_INTERVAL if len(SERVERS) > len(SERVER_COLUMNS) else 0,
+        "page": PAGE_INTERVAL if len(pages) > 1 else 0,
+    }, start=time.monotonic() + 1 - (time.time() % 1) + CLOCK_TICK_OFFSET)
+    drawn_versions = {}
+    # Stale keys of each section when it was last drawn: a section is also redrawn when they change, e.g. when its
+    # values stop being pushed (no new version) or come back
+    drawn_stale = {}
+    while True:
+        cells.begin_frame()
+        # Everything drawn in this iteration is sent at once, as a few coalesced rectangles
+        lcd_comm.BeginFrame()
+        due = clock.pop_due()
+        if "page" in due:
+            page_index = (page_index + 1) % len(pages)
+            lcd_comm.DisplayPILImage(frames[pages[page_index]])
+            # The frame covered every cell: redraw them all, clock included
+            cells.invalidate()
+            drawn_versions.clear()
+            due.append("clock")
+        if "clock" in due:
+            draw_clock(cells)
+        if "servers_page" in due:
+            drawn_versions.pop("servers", None)
+
+        # Redraw each section once its data has been fetched again (values that were not refreshed are dimmed)
+        versions, _, data = snapshot.get()
+        stale = stale_keys(METRIC_STORE.get_confirmed_times())
+        redrawn = False
+        for section, (draw, sources) in DASHBOARD_PAGES[pages[page_index]].sections.items():
+            section_versions = [versions.get(source, 0) for source in sources]
+            section_stale = {key for series in SCREEN_SERIES if series.section in sources
+                             for key in series_keys(series)} & stale
+            if section_versions[0] and (section_versions != drawn_versions.get(section)
+                                        or section_stale != drawn_stale.get(section)):
+                draw(cells, data, stale)
+                drawn_versions[section] = section_versions
+                drawn_stale[section] = section_stale
+                redrawn = True
+
+        rects = lcd_comm.EndFrame()
+        if redrawn:
+            logger.debug(f"Frame: {cells.sent} cells drawn in {len(rects)} transfers, {cells.skipped} unchanged cells "
+                         f"skipped (text cache: {lcd_comm.text_cache_hits} hits, {lcd_comm.text_cache_misses} misses)")
+
+        snapshot.wait_for_update(versions, timeout=clock.time_until_next())
+
+
 if __name__ == "__main__":
     main()
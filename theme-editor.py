@@ -93,6 +93,9 @@ def refresh_theme():
     # Initialize the display
     display.initialize_display()
 
+    # Decode the background regions behind transparent widgets
+    display.preload_background_crops()
+
     # Create all static images
     display.display_static_images()
 
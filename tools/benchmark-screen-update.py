@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# turing-smart-screen-python - a Python system monitor and library for USB-C displays like Turing Smart Screen or XuanFang
+# https://github.com/mathoudebine/turing-smart-screen-python/
+
+# Copyright (C) 2021-2023  Matthieu Houdebine (mathoudebine)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# benchmark-screen-update.py: Run the screen_update.py fetch + render path against a local fake InfluxDB/Prometheus
+# (canned responses with configurable latency/jitter) and an in-memory simulated LCD, then report p50/p95/p99 timings.
+# No live InfluxDB, Prometheus, WAN access or physical display is needed. Run from the repository root:
+#   python tools/benchmark-screen-update.py --iterations 200 --latency 40 --jitter 20
+#   python tools/benchmark-screen-update.py --backend prometheus
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STRING_VALUES = {
+    "location": ["Lisbon", "Porto"],
+    "isp": ["acme telecom", "ACME TELECOM"],
+    "ups_status": ["OL", "OL CHRG", "OB"],
+    "battery_charger_status": ["charging", "resting"],
+}
+
+
+class FakeInflux(BaseHTTPRequestHandler):
+    """Answers Flux and Prometheus queries with every screen series, plus ipify/ip-api lookups, after a simulated
+    network delay."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: don't let Nagle + delayed ACK add ~40 ms to every response
+    disable_nagle_algorithm = True
+    series = []
+    history_series = []
+    latency = 0.0
+    jitter = 0.0
+    # Number of queries answered with an error
+    rejected = 0
+
+    def log_message(self, format, *args):
+        return
+
+    def _delay(self):
+        time.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+
+    def _reply(self, body: str, content_type: str, status: int = 200):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._delay()
+        if self.path.startswith("/api/v1/"):
+            self._reply(prometheus_json(self.path, parse_qs(body.decode("utf-8")), self.series),
+                        "application/json")
+            return
+
+        query = json.loads(body or "{}").get("query", "")
+        error = flux_error(query) if self.path.startswith("/api/v2/query") else None
+        if error:
+            FakeInflux.rejected += 1
+            self._reply(json.dumps({"code": "invalid", "message": error}), "application/json", 400)
+        elif self.path.startswith("/api/v2/query") and "aggregateWindow" in query:
+            # Sparkline history: one point per window in the requested range(s)
+            ranges = [(int(start), int(stop)) for start, stop in re.findall(r"range\(start: (\d+), stop: (\d+)\)", query)]
+            window = int(re.search(r"every: (\d+)s", query).group(1))
+            start, stop = min(start for start, _ in ranges), max(stop for _, stop in ranges)
+            self._reply(flux_csv(self.history_series, range(start + window, stop + 1, window)),
+                        "text/csv; charset=utf-8")
+        elif self.path.startswith("/api/v2/query"):
+            self._reply(flux_csv(self.series), "text/csv; charset=utf-8")
+        else:
+            self._reply("", "text/plain", 404)
+
+    def do_GET(self):
+        self._delay()
+        if self.path.startswith("/ping"):
+            self._reply("", "text/plain", 204)
+        elif self.path.startswith("/ipify"):
+            self._reply(json.dumps({"ip": "192.0.2.10"}), "application/json")
+        elif self.path.startswith("/ip-api"):
+            self._reply(json.dumps({"status": "success", "city": "Lisbon", "countryCode": "PT", "isp": "ACME"}),
+                        "application/json")
+        else:
+            self._reply("", "text/plain", 404)
+
+
+def flux_error(query: str):
+    # Checks a real InfluxDB makes that canned responses would otherwise hide: error message, None if valid
+    for tables in re.findall(r"union\(tables: \[([^\]]*)\]\)", query):
+        if len([name for name in tables.split(",") if name.strip()]) < 2:
+            return 'error calling function "union": union must have at least two streams as input'
+    return None
+
+
+def check_queries(screen_update):
+    # Each section is also fetched on its own (own refresh interval, or FETCH_MODE=concurrent), and the sparkline
+    # history may be caught up for a single series: every such query must be valid
+    sections = dict.fromkeys(series.section for series in screen_update.SCREEN_SERIES)
+    queries = [screen_update.build_screen_query([series for series in screen_update.SCREEN_SERIES
+                                                 if series.section == section]) for section in sections]
+    queries.append(screen_update.build_screen_query(screen_update.SCREEN_SERIES))
+    queries += [screen_update.build_history_query([(series, 0)], 60, 60) for series in screen_update.HISTORY_SERIES]
+    queries.append(screen_update.build_history_query([(series, 0) for series in screen_update.HISTORY_SERIES], 60, 60))
+    for query in queries:
+        error = flux_error(query)
+        if error:
+            sys.exit(f"Invalid Flux query ({error}):\n{query}")
+
+
+def _expand(series):
+    # A grouped series (one tag given as a list) returns one row per tag value
+    for tag, value in series.tags.items():
+        if isinstance(value, list):
+            return [{**series.tags, tag: item} for item in value]
+    return [series.tags]
+
+
+def flux_csv(series_list, times=None) -> str:
+    # One annotated CSV table per series, with one row per time (now by default) and fresh random values so the
+    # screen cells change every iteration
+    stamps = [time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(sampled_at)) for sampled_at in times or [time.time()]]
+    blocks = []
+    for series, tag_values in ((series, tags) for series in series_list for tags in _expand(series)):
+        table = len(blocks)
+        tags = list(tag_values)
+        columns = ["result", "table", "_start", "_stop", "_time", "_value", "_field", "_measurement"] + tags
+        value_type = "string" if series.field in STRING_VALUES else "double"
+        datatypes = ["string", "long", "dateTime:RFC3339", "dateTime:RFC3339", "dateTime:RFC3339", value_type,
+                     "string", "string"] + ["string"] * len(tags)
+        group = ["false", "false", "true", "true", "false", "false", "true", "true"] + ["true"] * len(tags)
+        rows = []
+        for stamp in stamps:
+            if series.field in STRING_VALUES:
+                value = random.choice(STRING_VALUES[series.field])
+            else:
+                value = f"{random.uniform(20, 95):.2f}"
+            row = ["", str(table), stamp, stamp, stamp, value, series.field, series.measurement or "speedtest"]
+            rows.append("," + ",".join(row + [tag_values[tag] for tag in tags]))
+        blocks.append("\n".join([
+            "#datatype," + ",".join(datatypes),
+            "#group," + ",".join(group),
+            "#default,_result," + "," * (len(columns) - 2),
+            "," + ",".join(columns),
+        ] + rows))
+    return "\n\n".join(blocks) + "\n\n"
+
+
+def prometheus_json(path: str, form: dict, series_list) -> str:
+    # Every numeric series as a Prometheus metric (`<measurement>_<field>`, tags as labels): one sample for an
+    # instant query, one per step for a range query
+    if path.startswith("/api/v1/query_range"):
+        start, end = float(form["start"][0]), float(form["end"][0])
+        step = float(form["step"][0].rstrip("s"))
+        times = [start + step * index for index in range(int((end - start) // step) + 1)]
+    else:
+        times = [time.time()]
+    # query_latest() also asks for the time of each sample, labelled with its metric name
+    with_timestamps = "timestamp(" in form.get("query", [""])[0]
+    result = []
+    for series in series_list:
+        if series.field in STRING_VALUES:
+            continue
+        for tags in _expand(series):
+            metric = {"__name__": f"{series.measurement or 'speedtest'}_{series.field}", **tags}
+            samples = [[sampled_at, f"{random.uniform(20, 95):.2f}"] for sampled_at in times]
+            if path.startswith("/api/v1/query_range"):
+                result.append({"metric": metric, "values": samples})
+            else:
+                result.append({"metric": metric, "value": samples[0]})
+                if with_timestamps:
+                    sampled_at = times[0] - random.uniform(0, 15)
+                    result.append({"metric": {"sample_of": metric["__name__"], **tags},
+                                   "value": [times[0], f"{sampled_at:.3f}"]})
+    result_type = "matrix" if path.startswith("/api/v1/query_range") else "vector"
+    return json.dumps({"status": "success", "data": {"resultType": result_type, "result": result}})
+
+
+def percentile(values, pct: float) -> float:
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the screen_update.py fetch + render path")
+    parser.add_argument("--iterations", type=int, default=100, help="number of fetch + render iterations")
+    parser.add_argument("--latency", type=float, default=20.0, help="fake server response latency (ms)")
+    parser.add_argument("--jitter", type=float, default=5.0, help="fake server latency jitter, +/- (ms)")
+    parser.add_argument("--backend", choices=["influx", "prometheus"], default="influx",
+                        help="metrics backend queried through the fake server")
+    parser.add_argument("--fetch-mode", choices=["batched", "concurrent"], default="batched",
+                        help="one query for the whole screen, or one query per section in parallel")
+    parser.add_argument("--no-cell-cache", action="store_true", help="redraw every cell, even when unchanged")
+    parser.add_argument("--no-frames", action="store_true",
+                        help="send every draw immediately instead of coalescing each frame's dirty rectangles")
+    parser.add_argument("--save", metavar="PNG", help="save the last simulated frame to this file")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # screen_update reads its configuration from the environment when imported
+    os.environ.update({
+        "INFLUXDB_URL": base_url,
+        "INFLUXDB_TOKEN": "benchmark",
+        "INFLUXDB_ORG": "benchmark",
+        "METRICS_BACKEND": args.backend,
+        "FETCH_MODE": args.fetch_mode,
+        "PROMETHEUS_URL": base_url,
+        "IPIFY_URL": base_url + "/ipify",
+        "IP_API_URL": base_url + "/ip-api/{ip}",
+        "IP_CACHE_FILE": os.path.join(tempfile.mkdtemp(), "ip_details.json"),
+    })
+    import screen_update
+    from PIL import Image
+    from library.lcd.lcd_comm import LcdComm
+    from library.lcd.lcd_comm_rev_a import LcdCommRevA
+    from library.lcd.lcd_simulated import LcdSimulated
+
+    check_queries(screen_update)
+    FakeInflux.series = screen_update.SCREEN_SERIES
+    FakeInflux.history_series = screen_update.HISTORY_SERIES
+    FakeInflux.latency = args.latency / 1000
+    FakeInflux.jitter = args.jitter / 1000
+
+    class BenchmarkLcd(LcdSimulated):
+        # Simulated LCD kept in memory: frames are encoded to the rev. A wire format (RGB565) instead of sent
+        def __init__(self):
+            LcdComm.__init__(self, display_width=320, display_height=480)
+            self.screen_image = Image.new("RGB", (self.get_width(), self.get_height()), (0, 0, 0))
+            self.transmit_time = 0.0
+            self.sent_bytes = 0
+            self.transfers = 0
+
+        def closeSerial(self):
+            pass
+
+        def SendPILImage(self, image, x=0, y=0, image_width=0, image_height=0):
+            start = time.perf_counter()
+            self.sent_bytes += len(LcdCommRevA.imageToRGB565LE(image))
+            self.transfers += 1
+            self.screen_image.paste(image, (x, y))
+            self.transmit_time += time.perf_counter() - start
+
+    lcd = BenchmarkLcd()
+    lcd.glyph_atlas_enabled = screen_update.GLYPH_ATLAS
+    # Static layer, as main() sends it: composed off-screen, then one full-screen transfer
+    startup = time.perf_counter()
+    lcd.DisplayPILImage(screen_update.render_static_frame(screen_update.draw_static_layout))
+    startup = time.perf_counter() - startup
+    startup_bytes = lcd.sent_bytes
+    cells = lcd if args.no_cell_cache else screen_update.CellCache(lcd)
+    source = screen_update.create_metrics_source()
+
+    timings = {"fetch": [], "rasterise": [], "transmit": [], "frame": []}
+    sent_bytes, transfers = [], []
+    for _ in range(args.iterations):
+        frame_start = time.perf_counter()
+        data = screen_update.fetch_screen_data(source)
+        fetched = time.perf_counter()
+
+        lcd.transmit_time, lcd.sent_bytes, lcd.transfers = 0.0, 0, 0
+        if not args.no_cell_cache:
+            cells.begin_frame()
+        if not args.no_frames:
+            lcd.BeginFrame()
+        screen_update.draw_clock(cells)
+        for draw, _ in screen_update.RENDER_SECTIONS.values():
+            draw(cells, data)
+        if not args.no_frames:
+            lcd.EndFrame()
+        rendered = time.perf_counter()
+
+        timings["fetch"].append(fetched - frame_start)
+        timings["rasterise"].append(rendered - fetched - lcd.transmit_time)
+        timings["transmit"].append(lcd.transmit_time)
+        timings["frame"].append(rendered - frame_start)
+        sent_bytes.append(lcd.sent_bytes)
+        transfers.append(lcd.transfers)
+
+    print(f"{args.iterations} iterations ({args.fetch_mode}), fake {source.name} latency {args.latency:.0f} +/- "
+          f"{args.jitter:.0f} ms, reconnects: {getattr(source, 'reconnects', 0)}, rejected queries: {FakeInflux.rejected}")
+    print(f"static layer: {startup * 1000:.2f}ms, {startup_bytes} wire bytes")
+    print(f"{'':<10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, values in timings.items():
+        print(f"{name:<10}" + "".join(f"{percentile(values, pct) * 1000:>8.2f}ms" for pct in (50, 95, 99)))
+    print(f"wire bytes/frame: p50 {percentile(sent_bytes, 50):.0f}, max {max(sent_bytes)}")
+    print(f"transfers/frame: p50 {percentile(transfers, 50):.0f}, max {max(transfers)}")
+    print(f"text cache: {lcd.text_cache_hits} hits, {lcd.text_cache_misses} misses")
+
+    if args.save:
+        lcd.screen_image.save(args.save)
+
+    source.close()
+    server.shutdown()
+    if FakeInflux.rejected:
+        sys.exit(f"{FakeInflux.rejected} queries were rejected by the fake server")
+
+
+if __name__ == "__main__":
+    main()